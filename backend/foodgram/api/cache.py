@@ -0,0 +1,60 @@
+import time
+
+from django.core.cache import cache
+
+VERSION_PREFIX = 'version'
+
+
+def version_key(name):
+    return f'{VERSION_PREFIX}:{name}'
+
+
+def get_version(name):
+    """
+    Current version of a group of cached data.
+    Versions live in the cache backend, every process sees the same
+    value only with a shared backend (memcached in infra),
+    the default LocMemCache is for a single process.
+    """
+    return cache.get_or_set(version_key(name),
+                            int(time.time() * 1000), None)
+
+
+def bump_version(name):
+    """Invalidates everything cached under the previous version."""
+    try:
+        return cache.incr(version_key(name))
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(version_key(name), version, None)
+        return version
+
+
+local_cache = {}
+LOCAL_CACHE_SIZE = 1024
+# entries of previous versions are never read again and expire
+SHARED_TIMEOUT = 60 * 60
+
+
+def get_or_build(name, key, build, timeout=SHARED_TIMEOUT):
+    """
+    Value for `key` in the current version of `name`.
+    Looks in the process-local copy first, then in the cache backend,
+    and calls build() only when both miss.
+    """
+    version = get_version(name)
+    local_version, entries = local_cache.get(name, (None, None))
+    if local_version != version:
+        entries = {}
+        local_cache[name] = (version, entries)
+    if key in entries:
+        return entries[key]
+    shared_key = f'{name}:{version}:{key}'
+    value = cache.get(shared_key)
+    if value is None:
+        value = build()
+        cache.set(shared_key, value, timeout)
+    if len(entries) >= LOCAL_CACHE_SIZE:
+        entries.clear()
+    entries[key] = value
+    return value
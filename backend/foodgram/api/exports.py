@@ -0,0 +1,60 @@
+import logging
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from . import shopping_list
+from .tasks import submit
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = 'shopping_lists'
+JOB_TIMEOUT = 60 * 60
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def job_key(job_id):
+    return f'shopping-list-export:{job_id}'
+
+
+def export_name(job_id):
+    return f'{EXPORT_DIR}/{job_id}.pdf'
+
+
+def start_export(ingredients):
+    """
+    Queues rendering of the shopping list to MEDIA_ROOT.
+    The job id is the hash of the cart content, so the same cart
+    is rendered once and finished files are reused.
+    """
+    job_id = shopping_list.content_hash(ingredients)
+    if default_storage.exists(export_name(job_id)):
+        return job_id
+    if cache.get(job_key(job_id)) == FAILED:
+        cache.delete(job_key(job_id))
+    if cache.add(job_key(job_id), PENDING, JOB_TIMEOUT):
+        submit(render_export, job_id, ingredients)
+    return job_id
+
+
+def render_export(job_id, ingredients):
+    try:
+        pdf = shopping_list.get_pdf(ingredients)
+        name = export_name(job_id)
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(pdf))
+        cache.set(job_key(job_id), DONE, JOB_TIMEOUT)
+    except Exception:
+        logger.exception('Shopping list export %s failed', job_id)
+        cache.set(job_key(job_id), FAILED, JOB_TIMEOUT)
+
+
+def get_status(job_id):
+    """Status of the job or None if it is unknown."""
+    if default_storage.exists(export_name(job_id)):
+        return DONE
+    return cache.get(job_key(job_id))
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models import Count, Q
+
+from recipes.models import Recipe
+
+from .cache import bump_version, get_or_build
+from .filters import ALL, ANY, RecipeFilter, tag_ids_by_slug, tags_condition
+
+FACETS = 'recipe-facets'
+# query parameters that do not filter recipes
+PAGE_PARAMS = ('page', 'limit', 'cursor', 'pagination', 'facets', 'format',
+               'ordering')
+COOKING_TIME_BUCKETS = (
+    ('0-15', Q(cooking_time__lte=15)),
+    ('16-30', Q(cooking_time__gt=15, cooking_time__lte=30)),
+    ('31-60', Q(cooking_time__gt=30, cooking_time__lte=60)),
+    ('60+', Q(cooking_time__gt=60)),
+)
+
+
+def count(condition=None):
+    if condition is None:
+        return Count('id')
+    return Count('id', filter=condition)
+
+
+def both(first, second):
+    if first is None or second is None:
+        return first if second is None else second
+    return first & second
+
+
+def get_facets(queryset, slugs=(), mode=ANY):
+    """
+    Number of recipes per tag and per cooking time bucket
+    in one conditional aggregate query.
+    queryset - recipes under every filter except the tags.
+    Tag counts ignore the selected tags in the "any" mode
+    and include them in the "all" mode,
+    cooking time counts always include them.
+    """
+    condition = tags_condition(slugs, mode) if slugs else None
+    if slugs and condition is None:
+        return {
+            'tags': {slug: 0 for slug in tag_ids_by_slug()},
+            'cooking_time': {name: 0 for name, _ in COOKING_TIME_BUCKETS},
+        }
+    if condition is not None:
+        condition = Q(id__in=Recipe.objects.filter(condition).values('id'))
+    tag_ids = tag_ids_by_slug()
+    aggregates = {}
+    for position, tag_id in enumerate(tag_ids.values()):
+        has_tag = Q(id__in=Recipe.tags.through.objects.filter(
+            tag_id=tag_id).values('recipe'))
+        aggregates[f'tag_{position}'] = count(
+            both(has_tag, condition if mode == ALL else None))
+    for position, (name, bucket) in enumerate(COOKING_TIME_BUCKETS):
+        aggregates[f'time_{position}'] = count(both(bucket, condition))
+    counts = queryset.order_by().aggregate(**aggregates)
+    return {
+        'tags': {slug: counts[f'tag_{position}']
+                 for position, slug in enumerate(tag_ids)},
+        'cooking_time': {name: counts[f'time_{position}']
+                         for position, (name, _) in
+                         enumerate(COOKING_TIME_BUCKETS)},
+    }
+
+
+def recipe_facets(request):
+    """
+    Facets under the filters of the request,
+    facets of all recipes are cached per FACETS version.
+    """
+    data = request.query_params.copy()
+    slugs = data.pop('tags', [])
+    mode = ALL if data.pop('tags_mode', [ANY])[-1] == ALL else ANY
+    for param in PAGE_PARAMS:
+        data.pop(param, None)
+    if not slugs and not data:
+        return get_or_build(FACETS, 'all',
+                            lambda: get_facets(Recipe.objects.all()))
+    queryset = RecipeFilter(data, Recipe.objects.all(), request=request).qs
+    return get_facets(queryset, slugs, mode)
+
+
+def invalidate_facets():
+    transaction.on_commit(lambda: bump_version(FACETS))
@@ -0,0 +1,51 @@
+from django.core.files.uploadedfile import UploadedFile
+from django.utils.translation import gettext as _
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+from recipes.images import rendition_url, strip_metadata
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Image of a recipe, Base64 string or a file from a multipart form:
+    1. The size is checked before a Base64 payload is decoded
+    2. Metadata (EXIF) is removed from the saved file.
+    """
+    max_size = 5 * 1024 * 1024
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            size = len(data.split(';base64,')[-1]) * 3 // 4
+        else:
+            size = getattr(data, 'size', 0)
+        if size > self.max_size:
+            raise serializers.ValidationError(
+                _(f'Размер изображения больше {self.max_size} байт'))
+        if isinstance(data, UploadedFile):
+            image = serializers.ImageField.to_internal_value(self, data)
+        else:
+            image = super().to_internal_value(data)
+        if image is None:
+            return image
+        return strip_metadata(image)
+
+
+class RenditionImageField(serializers.ImageField):
+    """
+    URL of a resized copy of the image,
+    the original is returned until the copy is ready.
+    """
+    def __init__(self, rendition, **kwargs):
+        self.rendition = rendition
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        url = rendition_url(value, self.rendition)
+        if url is None:
+            return super().to_representation(value)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
@@ -1,27 +1,86 @@
+from django.db.models import Count, Exists, F, OuterRef
 from django_filters import filters
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend
 
 from recipes.models import Recipe, Tag
-from users.models import User
+
+from .cache import get_or_build
+from .search import ingredient_index
+
+ANY = 'any'
+ALL = 'all'
+TAGS_MODES = ((ANY, 'any'), (ALL, 'all'))
+# ordering: precomputed score field (update_popularity)
+SCORE_FIELDS = {
+    'popular': 'popularity_score',
+    'trending': 'trending_score',
+}
+
+
+def tag_ids_by_slug():
+    """slug -> id of every tag, cached per version of the tags."""
+    return get_or_build('tags', 'slug-map', lambda: dict(
+        Tag.objects.values_list('slug', 'id')))
+
+
+def tags_condition(slugs, mode=ANY):
+    """
+    EXISTS over the recipe-tag table for recipes with any (or all)
+    of the tags, None when no recipe can match (unknown slugs).
+    """
+    tag_map = tag_ids_by_slug()
+    tag_ids = {tag_map[slug] for slug in slugs if slug in tag_map}
+    if not tag_ids or (mode == ALL and len(tag_ids) < len(set(slugs))):
+        return None
+    recipe_tags = Recipe.tags.through.objects.filter(
+        recipe=OuterRef('pk'), tag_id__in=tag_ids)
+    if mode == ALL and len(tag_ids) > 1:
+        recipe_tags = recipe_tags.order_by().values('recipe').annotate(
+            tags_number=Count('tag')).filter(tags_number=len(tag_ids))
+    return Exists(recipe_tags)
+
+
+def filter_by_tags(queryset, slugs, mode=ANY):
+    """
+    Recipes with any (or all) of the tags, each recipe once:
+    a single EXISTS, no joins and no DISTINCT.
+    """
+    condition = tags_condition(slugs, mode)
+    if condition is None:
+        return queryset.none()
+    return queryset.filter(condition)
 
 
 class RecipeFilter(FilterSet):
     """
     Filtering recipes:
-    1. By multiple tags
+    1. By multiple tags, tags_mode=any (by default) or all
     2. By the author of the publication
     3. Only selected recipes
-    4. Only recipes in the shopping list.
+    4. Only recipes in the shopping list
+    5. Full-text search by name, description and ingredients
+    6. ordering=popular or trending - by the precomputed scores.
     """
-    tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
-                                             queryset=Tag.objects.all(),
-                                             to_field_name='slug')
-    author = filters.ModelChoiceFilter(queryset=User.objects.all())
+    tags = filters.CharFilter(method='filter_tags')
+    tags_mode = filters.ChoiceFilter(choices=TAGS_MODES,
+                                     method='filter_tags_mode')
+    author = filters.NumberFilter(field_name='author_id')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in SCORE_FIELDS],
+        method='filter_ordering')
+
+    def filter_tags(self, queryset, name, value):
+        return filter_by_tags(queryset, self.data.getlist(name),
+                              self.form.cleaned_data.get('tags_mode') or ANY)
+
+    def filter_tags_mode(self, queryset, name, value):
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
@@ -33,11 +92,30 @@ class RecipeFilter(FilterSet):
             return queryset.filter(shopping_carts__user=self.request.user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
+
+    def filter_ordering(self, queryset, name, value):
+        """The score is annotated, so it is read even with only('id')."""
+        return queryset.annotate(score=F(SCORE_FIELDS[value])).order_by(
+            '-score', '-id')
+
     class Meta:
         model = Recipe
         fields = ['tags', 'author']
 
 
-class IngredientSearchFilter(SearchFilter):
-    """Ingredients Search Filter"""
+class IngredientSearchFilter(BaseFilterBackend):
+    """
+    Ingredients Search Filter for autocomplete:
+    names starting with the query go first, then names containing it.
+    No more than max_results ingredients are returned.
+    """
     search_param = 'name'
+    max_results = 20
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query or view.action != 'list':
+            return queryset
+        return ingredient_index.search(query, self.max_results)
@@ -0,0 +1,97 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.images import make_renditions
+from recipes.models import Recipe
+
+from .cache import bump_version, get_version, version_key
+
+RECIPES = 'recipes'
+PAYLOAD_PREFIX = 'recipe-payload'
+PAYLOAD_TIMEOUT = 60 * 60 * 24
+
+
+def recipe_version_name(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def get_recipe_versions(recipe_ids):
+    """
+    Versions of several recipes in one cache round trip,
+    missing versions are started from the current time.
+    """
+    keys = {recipe_id: version_key(recipe_version_name(recipe_id))
+            for recipe_id in recipe_ids}
+    versions = cache.get_many(keys.values())
+    missing = {key: int(time.time() * 1000) for key in keys.values()
+               if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return {recipe_id: versions[key] for recipe_id, key in keys.items()}
+
+
+def get_payloads(recipe_ids, host, build):
+    """
+    User-independent payloads of the recipes in the order of recipe_ids.
+    The key holds the 'recipes' version (tags, ingredients and authors),
+    the version of the recipe and the host of the absolute image urls.
+    build(ids) serializes the missing recipes.
+    """
+    version = get_version(RECIPES)
+    recipe_versions = get_recipe_versions(recipe_ids)
+    keys = {recipe_id: (f'{PAYLOAD_PREFIX}:{version}:'
+                        f'{recipe_versions[recipe_id]}:{host}:{recipe_id}')
+            for recipe_id in recipe_ids}
+    cached = cache.get_many(keys.values())
+    payloads = {recipe_id: cached[key] for recipe_id, key in keys.items()
+                if key in cached}
+    missing = [recipe_id for recipe_id in recipe_ids
+               if recipe_id not in payloads]
+    if missing:
+        built = {payload['id']: payload for payload in build(missing)}
+        cache.set_many({keys[recipe_id]: payload
+                        for recipe_id, payload in built.items()},
+                       PAYLOAD_TIMEOUT)
+        payloads.update(built)
+    return [payloads[recipe_id] for recipe_id in recipe_ids
+            if recipe_id in payloads]
+
+
+def invalidate_recipe(recipe_id):
+    """After the commit, so a concurrent reader can not cache old rows."""
+    transaction.on_commit(
+        lambda: bump_version(recipe_version_name(recipe_id)))
+
+
+def bump_author_recipes(author_id):
+    """New versions of every recipe of the author, two cache round trips."""
+    keys = [version_key(recipe_version_name(recipe_id)) for recipe_id in
+            Recipe.objects.filter(author_id=author_id).values_list(
+                'id', flat=True)]
+    versions = cache.get_many(keys)
+    if versions:
+        cache.set_many({key: version + 1 for key, version in versions.items()},
+                       None)
+
+
+def invalidate_author(author_id):
+    """The author is a part of the payloads of their recipes only."""
+    transaction.on_commit(lambda: bump_author_recipes(author_id))
+
+
+def invalidate_recipes():
+    transaction.on_commit(lambda: bump_version(RECIPES))
+
+
+def make_recipe_renditions(recipe_id, name):
+    """
+    Cached payloads point to the original image until the copies exist.
+    The flag is set only if the recipe still has the same image.
+    """
+    make_renditions(name)
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        renditions_ready=True)
+    bump_version(recipe_version_name(recipe_id))
@@ -0,0 +1,199 @@
+import json
+import platform
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext as _
+from rest_framework.test import APIClient
+
+from api import shopping_list
+from recipes.models import Recipe, Tag
+from users.models import User
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(durations, rank):
+    """Nearest-rank percentile of sorted durations."""
+    index = max(0, -(-len(durations) * rank // 100) - 1)
+    return durations[index]
+
+
+class Command(BaseCommand):
+    help = ('Measures latency percentiles and throughput of the API '
+            'endpoints with the Django test client, writes JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', default=100, type=int,
+                            help='Measured requests per endpoint')
+        parser.add_argument('--warmup', default=5, type=int)
+        parser.add_argument('--username',
+                            help='Benchmark user, by default the user '
+                                 'with the most favorites')
+        parser.add_argument('--output', help='JSON file, stdout by default')
+        parser.add_argument('--only', nargs='*',
+                            help='Names of the endpoints to run')
+
+    def get_user(self, username):
+        if username:
+            return User.objects.filter(username=username).first()
+        return User.objects.annotate(
+            favorites_number=Count('recipes_favorites')).order_by(
+                '-favorites_number', 'id').first()
+
+    def get_endpoints(self, user):
+        """
+        name: (method, url, authenticated).
+        Toggles are sent in pairs (add, then remove),
+        so the data is the same after the run.
+        The export status is the one of the job started by
+        shopping-cart-export (the job id is the hash of the cart).
+        """
+        recipe = Recipe.objects.exclude(favorites__user=user).exclude(
+            shopping_carts__user=user).order_by('-id').first()
+        detail = Recipe.objects.order_by('-id').first()
+        author = User.objects.exclude(id=user.id).exclude(
+            following__user=user).order_by('-id').first()
+        tag = Tag.objects.first()
+        ingredients = [ingredient_recipe.ingredient for ingredient_recipe in
+                       detail.ingredients.select_related('ingredient')[:3]]
+        ingredient_ids = ','.join(str(ingredient.id)
+                                  for ingredient in ingredients)
+        job_id = shopping_list.content_hash(list(shopping_list.normalize(
+            shopping_list.aggregate(user).iterator())))
+        endpoints = {
+            'recipes-list': ('get', '/api/recipes/', False),
+            'recipes-list-user': ('get', '/api/recipes/', True),
+            'recipes-detail': ('get', f'/api/recipes/{detail.id}/', True),
+            'recipes-filter-favorited': (
+                'get', '/api/recipes/?is_favorited=1', True),
+            'recipes-filter-tags': (
+                'get', f'/api/recipes/?tags={tag.slug}', False),
+            'recipes-search': ('get', '/api/recipes/?search=рецепт', False),
+            'recipes-popular': ('get', '/api/recipes/?ordering=popular',
+                                False),
+            'recipes-trending': (
+                'get', '/api/recipes/?ordering=trending&pagination=cursor',
+                False),
+            'recipes-match': (
+                'get', f'/api/recipes/match/?ingredients={ingredient_ids}',
+                False),
+            'shopping-cart-txt': (
+                'get', '/api/recipes/download_shopping_cart/?format=txt',
+                True),
+            'shopping-cart-pdf': (
+                'get', '/api/recipes/download_shopping_cart/', True),
+            'shopping-cart-export': (
+                'post', '/api/recipes/export_shopping_cart/', True),
+            'shopping-cart-export-status': (
+                'get', f'/api/recipes/export_shopping_cart/{job_id}/', True),
+            'tags-list': ('get', '/api/tags/', False),
+            'tags-detail': ('get', f'/api/tags/{tag.id}/', False),
+            'ingredients-search': (
+                'get', f'/api/ingredients/?name={ingredients[0].name[:3]}',
+                False),
+            'users-subscriptions': ('get', '/api/users/subscriptions/', True),
+            'users-feed': ('get', '/api/users/feed/', True),
+            'users-me': ('get', '/api/users/me/', True),
+        }
+        if recipe is not None:
+            for name in ('favorite', 'shopping_cart'):
+                url = f'/api/recipes/{recipe.id}/{name}/'
+                endpoints[f'{name}-add'] = ('post', url, True)
+                endpoints[f'{name}-remove'] = ('delete', url, True)
+        if author is not None:
+            url = f'/api/users/{author.id}/subscribe/'
+            endpoints['subscribe-add'] = ('post', url, True)
+            endpoints['subscribe-remove'] = ('delete', url, True)
+        return endpoints
+
+    def request(self, client, method, url):
+        response = getattr(client, method)(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def run(self, clients, endpoints, names, count):
+        """Timed requests, queries are not captured here."""
+        durations = {name: [] for name in names}
+        statuses = {name: {} for name in names}
+        for _number in range(count):
+            for name in names:
+                method, url, authenticated = endpoints[name]
+                start = time.perf_counter()
+                status = self.request(clients[authenticated], method, url)
+                durations[name].append(time.perf_counter() - start)
+                statuses[name][status] = statuses[name].get(status, 0) + 1
+        return durations, statuses
+
+    def count_queries(self, clients, endpoints, names):
+        """Queries of one warm request per endpoint, a separate pass."""
+        queries = {}
+        for name in names:
+            method, url, authenticated = endpoints[name]
+            with CaptureQueriesContext(connection) as captured:
+                self.request(clients[authenticated], method, url)
+            queries[name] = len(captured)
+        return queries
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError(_('--requests must be a positive number'))
+        user = self.get_user(options['username'])
+        if user is None or not Recipe.objects.exists():
+            raise CommandError(_('No data, run generate_dataset first'))
+        endpoints = self.get_endpoints(user)
+        names = options['only'] or list(endpoints)
+        unknown = set(names) - set(endpoints)
+        if unknown:
+            raise CommandError(
+                _('Unknown endpoints: ') + ', '.join(sorted(unknown)))
+        client = APIClient()
+        client.force_authenticate(user)
+        clients = {False: APIClient(), True: client}
+        self.run(clients, endpoints, names, options['warmup'])
+        durations, statuses = self.run(
+            clients, endpoints, names, options['requests'])
+        queries = self.count_queries(clients, endpoints, names)
+        results = {}
+        elapsed = 0
+        for name in names:
+            measured = sorted(durations[name])
+            total = sum(measured)
+            elapsed += total
+            results[name] = {
+                'method': endpoints[name][0].upper(),
+                'url': endpoints[name][1],
+                'requests': len(measured),
+                'statuses': statuses[name],
+                'queries': queries[name],
+                'mean_ms': round(total / len(measured) * 1000, 2),
+                **{f'p{rank}_ms': round(
+                    percentile(measured, rank) * 1000, 2)
+                   for rank in PERCENTILES},
+                'throughput_rps': round(len(measured) / total, 1),
+            }
+        report = json.dumps({
+            'started': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+            },
+            'requests': len(names) * options['requests'],
+            'throughput_rps': round(
+                len(names) * options['requests'] / elapsed, 1),
+            'endpoints': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+            self.stdout.write(self.style.SUCCESS(
+                f'Results written to {options["output"]}'))
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,84 @@
+import uuid
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.translation import gettext as _
+from rest_framework.test import APIClient
+
+from recipes.dataset import populate
+from recipes.models import Recipe
+from users.models import User
+
+PAGE_SIZE = 10
+
+# name, url, authenticated, the most queries allowed with an empty cache
+BUDGETS = (
+    ('recipe list (anonymous)', f'/api/recipes/?limit={PAGE_SIZE}', False,
+     8),
+    ('recipe list', f'/api/recipes/?limit={PAGE_SIZE}', True, 9),
+    ('recipe detail', '/api/recipes/{recipe}/', True, 8),
+    ('subscriptions', f'/api/users/subscriptions/?limit={PAGE_SIZE}',
+     True, 4),
+    ('tags', '/api/tags/', False, 1),
+    ('ingredient search', '/api/ingredients/?name={ingredient}', False, 2),
+    ('shopping list (txt)', '/api/recipes/download_shopping_cart/?format=txt',
+     True, 1),
+    ('shopping list (pdf)', '/api/recipes/download_shopping_cart/', True, 1),
+)
+
+
+class Command(BaseCommand):
+    help = ('Seeds data in a rolled back transaction and checks '
+            'the number of queries of every endpoint against its budget')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=12, type=int)
+        parser.add_argument('--recipes', default=60, type=int)
+
+    def handle(self, *args, **options):
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'query-budget-{uuid.uuid4()}',
+        }}
+        with override_settings(CACHES=caches):
+            with transaction.atomic():
+                failures = self.check_budgets(options)
+                transaction.set_rollback(True)
+        if failures:
+            raise CommandError(_('Query budget exceeded: ')
+                               + ', '.join(failures))
+        self.stdout.write(self.style.SUCCESS('All query budgets are met'))
+
+    def check_budgets(self, options):
+        user_ids = populate(users=options['users'],
+                            recipes=options['recipes'],
+                            follows=PAGE_SIZE, favorites=PAGE_SIZE,
+                            shopping_cart=PAGE_SIZE)
+        user = User.objects.get(id=user_ids[0])
+        recipe = Recipe.objects.filter(author__in=user_ids).first()
+        ingredient = recipe.ingredients.select_related(
+            'ingredient').first().ingredient
+        anonymous, client = APIClient(), APIClient()
+        client.force_authenticate(user)
+        failures = []
+        for name, url, authenticated, budget in BUDGETS:
+            url = url.format(recipe=recipe.id,
+                             ingredient=ingredient.name[:12])
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = (client if authenticated else anonymous).get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            line = f'{name}: {len(queries)} queries (budget {budget})'
+            if response.status_code != 200:
+                failures.append(f'{name} ({response.status_code})')
+                self.stdout.write(self.style.ERROR(
+                    f'{line}, status {response.status_code}'))
+            elif len(queries) > budget:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return failures
@@ -0,0 +1,89 @@
+import heapq
+import threading
+from array import array
+from collections import Counter
+from itertools import chain
+
+from recipes.models import IngredientRecipe
+
+from .cache import get_version
+from .tasks import submit
+
+
+class IngredientMatcher:
+    """
+    Inverted index for "cook with what I have":
+    ingredient id -> sorted array of recipe positions.
+    Coverage of a recipe is the share of its ingredients the user has.
+    Postings of the user's ingredients are counted in C (Counter),
+    so only recipes sharing an ingredient with the user are touched.
+    The index is rebuilt when the 'recipe-ingredients' version changes:
+    only the first build is made on the request, later builds run
+    in the worker pool while the previous index is served.
+    """
+    def __init__(self):
+        # lock guards the building flag only, build_lock the first build
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.version = None
+        self.building = False
+        # (recipe ids, totals, postings), replaced as a whole
+        self.index = (array('q'), array('I'), {})
+
+    def refresh(self):
+        version = get_version('recipe-ingredients')
+        if version == self.version:
+            return
+        if self.version is None:
+            with self.build_lock:
+                if self.version is None:
+                    self.build(version)
+            return
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+        submit(self.build_in_background, version)
+
+    def build_in_background(self, version):
+        """No lock is held, requests keep reading the previous index."""
+        try:
+            self.build(version)
+        finally:
+            self.building = False
+
+    def build(self, version):
+        recipe_ids = array('q')
+        totals = array('I')
+        postings = {}
+        rows = IngredientRecipe.objects.order_by(
+            'recipe_id').values_list('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows.iterator():
+            if not recipe_ids or recipe_ids[-1] != recipe_id:
+                recipe_ids.append(recipe_id)
+                totals.append(0)
+            position = len(recipe_ids) - 1
+            totals[position] += 1
+            postings.setdefault(ingredient_id, array('I')).append(position)
+        self.index = (recipe_ids, totals, postings)
+        self.version = version
+
+    def match(self, ingredient_ids, limit):
+        """
+        [(recipe_id, coverage), ...] the best covered recipes first,
+        recipes with equal coverage ordered by the number of matches.
+        """
+        self.refresh()
+        recipe_ids, totals, postings = self.index
+        matches = Counter(chain.from_iterable(
+            postings.get(ingredient_id, ()) for ingredient_id in
+            set(ingredient_ids)))
+        best = heapq.nlargest(
+            limit, matches.items(),
+            key=lambda item: (item[1] / totals[item[0]], item[1],
+                              recipe_ids[item[0]]))
+        return [(recipe_ids[position], count / totals[position])
+                for position, count in best]
+
+
+ingredient_matcher = IngredientMatcher()
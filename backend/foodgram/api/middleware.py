@@ -0,0 +1,101 @@
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('api.metrics')
+
+# QueryMetrics of the request being handled
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class QueryMetrics:
+    """
+    connection.execute_wrapper hook:
+    number of queries and the time spent in the database.
+    serialize - time of the serializers without their queries
+    (TimedSerializerMixin).
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.serialize = 0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestMetricsMiddleware:
+    """
+    Metrics of every DRF view:
+    1. Number of queries and DB time
+    2. Serializer time (TimedSerializerMixin)
+    3. JSON render time (TimedJSONRenderer)
+    4. Total time and response size, the size of a streamed body
+       only when it has a Content-Length.
+    They are sent in the Server-Timing header and,
+    with REQUEST_METRICS_LOG, written as a JSON log line.
+    Queries of a streamed body run after the response leaves
+    the middleware and are not counted.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.is_api_view = hasattr(view_func, 'cls')
+
+    def __call__(self, request):
+        queries = QueryMetrics()
+        start = time.perf_counter()
+        token = current_metrics.set(queries)
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        if not getattr(request, 'is_api_view', False):
+            return response
+        total = time.perf_counter() - start
+        render = getattr(request, 'render_time', 0)
+        app = total - queries.duration - queries.serialize - render
+        size = self.get_size(response)
+        timings = [
+            f'db;dur={queries.duration * 1000:.1f};'
+            f'desc="{queries.count} queries"',
+            f'serialize;dur={queries.serialize * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'app;dur={app * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ]
+        if size is not None:
+            timings.append(f'size;desc="{size} bytes"')
+        response['Server-Timing'] = ', '.join(timings)
+        if settings.REQUEST_METRICS_LOG:
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': queries.count,
+                'db_ms': round(queries.duration * 1000, 1),
+                'serialize_ms': round(queries.serialize * 1000, 1),
+                'render_ms': round(render * 1000, 1),
+                'total_ms': round(total * 1000, 1),
+                'size': size,
+            }))
+        return response
+
+    def get_size(self, response):
+        if not response.streaming:
+            return len(response.content)
+        if response.has_header('Content-Length'):
+            return int(response['Content-Length'])
+        return None
@@ -1,3 +1,10 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete
+from django.utils.http import parse_etags
 from django.utils.translation import gettext as _
 from rest_framework import mixins, status, viewsets
 from rest_framework.generics import get_object_or_404
@@ -5,12 +12,90 @@ from rest_framework.response import Response
 
 from recipes.models import Recipe
 
+from .cache import get_or_build, get_version
+from .middleware import current_metrics
+
+
+class TimedSerializerMixin:
+    """
+    Adds the time of the outermost to_representation, without
+    its queries, to the metrics of the request (Server-Timing).
+    Nested serializers and fields are a part of it.
+    """
+    def to_representation(self, instance):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        start, db_duration = time.perf_counter(), metrics.duration
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serialize += (time.perf_counter() - start
+                                  - (metrics.duration - db_duration))
+            metrics.serializing = False
+
+
+def delete_once(model, **lookup):
+    """
+    Deletes the row found by lookup, True if this call deleted it.
+    QuerySet.delete() sends post_delete for every collected row even
+    when a concurrent request has deleted it first, so the counters
+    would go down twice. Here the row is removed by a raw DELETE
+    and post_delete is sent only when the DELETE removed it.
+    """
+    instance = model.objects.filter(**lookup).first()
+    if instance is None:
+        return False
+    queryset = model.objects.filter(pk=instance.pk)
+    if not queryset._raw_delete(queryset.db):
+        return False
+    post_delete.send(sender=model, instance=instance, using=queryset.db)
+    return True
+
 
 class ListRetrieveCustomViewSet(mixins.ListModelMixin,
                                 mixins.RetrieveModelMixin,
                                 viewsets.GenericViewSet):
-    """Only GET requests for Tags and Ingredients."""
-    pass
+    """
+    Only GET requests for Tags and Ingredients.
+    Responses are cached per version of cache_name
+    (in the process and in the cache backend) and carry an ETag,
+    If-None-Match with the current ETag gets 304 without a body.
+    The key holds only cache_params (stripped, lower case),
+    other query parameters do not create new entries.
+    """
+    cache_name = None
+    cache_params = ()
+
+    def get_cache_key(self, request):
+        params = sorted(
+            (name, request.query_params[name].strip().lower())
+            for name in self.cache_params
+            if request.query_params.get(name, '').strip())
+        return hashlib.md5(
+            f'{request.path}?{urlencode(params)}'.encode()).hexdigest()
+
+    def get_etag(self, request, key):
+        return f'"{self.cache_name}-{get_version(self.cache_name)}-{key}"'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        etag = self.get_etag(request, key)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={'ETag': etag})
+        data = get_or_build(
+            self.cache_name, key,
+            lambda: handler(request, *args, **kwargs).data)
+        return Response(data, headers={'ETag': etag})
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request,
+                                    *args, **kwargs)
 
 
 class CustomRecipeModelViewSet(viewsets.ModelViewSet):
@@ -21,19 +106,19 @@ class CustomRecipeModelViewSet(viewsets.ModelViewSet):
     """
     def add_obj(self, serializers, model, user, pk):
         recipe = get_object_or_404(Recipe, id=pk)
-        if model.objects.filter(user=user, recipe=recipe).exists():
+        try:
+            with transaction.atomic():
+                obj = model.objects.create(user=user, recipe=recipe)
+        except IntegrityError:
             return Response({'errors':
                              _(f'{recipe} уже добавлен в {model}')},
                             status=status.HTTP_400_BAD_REQUEST)
-        model.objects.create(user=user, recipe=recipe)
-        queryset = model.objects.get(user=user, recipe=recipe)
-        serializer = serializers(queryset)
+        serializer = serializers(obj)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def del_obj(self, model, pk, user):
-        recipe = get_object_or_404(Recipe, id=pk)
-        if not model.objects.filter(user=user, recipe=recipe).exists():
+        if not delete_once(model, user=user, recipe_id=pk):
+            recipe = get_object_or_404(Recipe, id=pk)
             return Response({'errors': _(f'{recipe} не добавлен в {model}')},
                             status=status.HTTP_400_BAD_REQUEST)
-        model.objects.get(user=user, recipe=recipe).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,11 +1,91 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+
+MAX_PAGE_SIZE = 100
+
+
+class LimitCursorPagination(CursorPagination):
+    """
+    Keyset paginator by -id or by the ordering of the queryset
+    (score, rank), does not count objects:
+    cursor - Position in the list
+    limit - The number of objects on the page.
+    """
+    ordering = '-id'
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        ordering = queryset.query.order_by
+        if ordering and all(isinstance(field, str) for field in ordering):
+            return tuple(ordering)
+        return super().get_ordering(request, queryset, view)
 
 
 class LimitPagePagination(PageNumberPagination):
     """
     Custom paginator:
     page - Page number
-    limit - The number of objects on the page.
+    limit - The number of objects on the page (no more than max_page_size)
+    pagination=cursor - Switches to LimitCursorPagination.
     """
     page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    mode_query_param = 'pagination'
+    cursor_class = LimitCursorPagination
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if (params.get(self.mode_query_param) == 'cursor'
+                or self.cursor_class.cursor_query_param in params):
+            self.cursor_paginator = self.cursor_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class KeysetIdPagination(LimitCursorPagination):
+    """
+    Cursor pages of ids fetched by fetch(limit, before),
+    the cursor holds the last id of the previous page:
+    cursor - Position in the list
+    limit - The number of objects on the page.
+    """
+    def paginate_ids(self, fetch, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        before = None
+        if cursor is not None:
+            try:
+                before = int(cursor.position)
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        ids = fetch(self.page_size + 1, before)
+        self.has_next = len(ids) > self.page_size
+        self.ids = ids[:self.page_size]
+        return self.ids
+
+    def get_paginated_response(self, data):
+        next_url = None
+        if self.has_next:
+            next_url = self.encode_cursor(Cursor(
+                offset=0, reverse=False, position=str(self.ids[-1])))
+        return Response(OrderedDict([
+            ('next', next_url),
+            ('previous', None),
+            ('results', data),
+        ]))
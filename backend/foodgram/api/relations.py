@@ -0,0 +1,100 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, Value
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+from .cache import bump_version, get_version
+
+FAVORITE = 'favorite'
+SHOPPING_CART = 'shopping_cart'
+FOLLOW = 'follow'
+RELATIONS_TIMEOUT = 60 * 60 * 24
+
+
+class UserRelations:
+    """
+    Ids the user is related to:
+    favorites - recipes in favorites
+    shopping_cart - recipes in the shopping list
+    following - authors the user is subscribed to.
+    """
+    def __init__(self, favorites=(), shopping_cart=(), following=()):
+        self.favorites = frozenset(favorites)
+        self.shopping_cart = frozenset(shopping_cart)
+        self.following = frozenset(following)
+
+    def apply(self, payload):
+        """Copy of a shared recipe payload with the flags of the user."""
+        data = dict(payload)
+        data['is_favorited'] = data['id'] in self.favorites
+        data['is_in_shopping_cart'] = data['id'] in self.shopping_cart
+        author = dict(data['author'])
+        author['is_subscribed'] = author['id'] in self.following
+        data['author'] = author
+        return data
+
+
+def kind_ids(queryset, kind, field):
+    return queryset.order_by().annotate(
+        kind=Value(kind, output_field=CharField())).values_list('kind', field)
+
+
+def load_relations(user):
+    """All three id sets of the user in one UNION query."""
+    if user.is_anonymous:
+        return UserRelations()
+    rows = kind_ids(Favorite.objects.filter(user=user), FAVORITE,
+                    'recipe_id').union(
+        kind_ids(ShoppingCart.objects.filter(user=user), SHOPPING_CART,
+                 'recipe_id'),
+        kind_ids(Follow.objects.filter(user=user), FOLLOW, 'author_id'),
+        all=True)
+    ids = {FAVORITE: [], SHOPPING_CART: [], FOLLOW: []}
+    for kind, related_id in rows:
+        ids[kind].append(related_id)
+    return UserRelations(ids[FAVORITE], ids[SHOPPING_CART], ids[FOLLOW])
+
+
+def relations_version_name(user_id):
+    return f'relations:{user_id}'
+
+
+def get_relations(user):
+    """
+    Relation sets of the user from the cache,
+    the version of the user is bumped by Favorite/ShoppingCart/Follow.
+    """
+    if user.is_anonymous:
+        return UserRelations()
+    name = relations_version_name(user.id)
+    key = f'{name}:{get_version(name)}'
+    relations = cache.get(key)
+    if relations is None:
+        relations = load_relations(user)
+        cache.set(key, relations, RELATIONS_TIMEOUT)
+    return relations
+
+
+def get_request_relations(request):
+    """Relation sets are read once per request."""
+    if not hasattr(request, 'user_relations'):
+        request.user_relations = get_relations(request.user)
+    return request.user_relations
+
+
+def get_context_relations(context):
+    """Relation sets passed to a serializer or those of the request user."""
+    relations = context.get('relations')
+    if relations is not None:
+        return relations
+    request = context.get('request')
+    if request is None:
+        return UserRelations()
+    return get_request_relations(request)
+
+
+def invalidate_relations(user_id):
+    transaction.on_commit(
+        lambda: bump_version(relations_version_name(user_id)))
@@ -0,0 +1,52 @@
+import json
+import time
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that adds its time to request.render_time
+    for RequestMetricsMiddleware.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        finally:
+            request = (renderer_context or {}).get('request')
+            if request is not None:
+                http_request = request._request
+                http_request.render_time = (
+                    getattr(http_request, 'render_time', 0)
+                    + time.perf_counter() - start)
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Shopping list formats for content negotiation.
+    The lists themselves are streamed by the view,
+    the renderer only writes error messages.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
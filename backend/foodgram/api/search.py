@@ -0,0 +1,88 @@
+import threading
+from bisect import bisect_left
+
+from django.db.models.functions import Lower
+
+from recipes.models import Ingredient
+
+from .cache import get_version
+
+
+class IngredientIndex:
+    """
+    In-process index of ingredient names for autocomplete.
+    Names are kept in a sorted list, prefix matches are found by
+    binary search, then the remaining substring matches are added.
+    The index is rebuilt when the 'ingredients' version changes.
+    Catalogues larger than max_size are searched in the database.
+    """
+    max_size = 50000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.keys = []
+        self.rows = []
+        self.enabled = True
+
+    def refresh(self):
+        version = get_version('ingredients')
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            self.enabled = Ingredient.objects.count() <= self.max_size
+            rows = []
+            if self.enabled:
+                rows = sorted(
+                    (name.lower(), ingredient_id, name, measurement_unit)
+                    for ingredient_id, name, measurement_unit in
+                    Ingredient.objects.values_list(
+                        'id', 'name', 'measurement_unit').iterator()
+                )
+            self.keys = [row[0] for row in rows]
+            self.rows = [Ingredient(id=row[1], name=row[2],
+                                    measurement_unit=row[3])
+                         for row in rows]
+            self.version = version
+
+    def search(self, query, limit):
+        """Prefix matches first, then substring matches."""
+        self.refresh()
+        if not self.enabled:
+            return self.search_db(query, limit)
+        query = query.lower()
+        keys = self.keys
+        result = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and len(result) < limit
+               and keys[position].startswith(query)):
+            result.append(self.rows[position])
+            position += 1
+        if len(result) < limit:
+            for position, key in enumerate(keys):
+                if query in key and not key.startswith(query):
+                    result.append(self.rows[position])
+                    if len(result) == limit:
+                        break
+        return result
+
+    def search_db(self, query, limit):
+        """
+        Fallback for large catalogues, case-insensitive as the index:
+        prefix search uses the lower(name) text_pattern_ops index
+        on PostgreSQL.
+        """
+        query = query.lower()
+        queryset = Ingredient.objects.alias(
+            name_lower=Lower('name')).order_by('name')
+        result = list(queryset.filter(name_lower__startswith=query)[:limit])
+        if len(result) < limit:
+            result += list(queryset.filter(
+                name_lower__contains=query).exclude(
+                    name_lower__startswith=query)[:limit - len(result)])
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -1,6 +1,8 @@
+import json
+
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils.translation import gettext as _
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
@@ -8,17 +10,43 @@ from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
 from users.models import Follow
 from users.serializers import CustomUserSerializers
 
+from .cache import bump_version
+from .fields import RecipeImageField, RenditionImageField
+from .fragments import make_recipe_renditions
+from .mixins import TimedSerializerMixin
+from .relations import get_context_relations
+from .tasks import submit
+
 
-class FollowRecipeSerializers(serializers.ModelSerializer):
+class FollowRecipeSerializers(TimedSerializerMixin,
+                              serializers.ModelSerializer):
     """
     Serializer for displaying a list of recipes in FollowUserSerializers.
     """
+    image = RenditionImageField('thumbnail')
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FollowUserSerializers(serializers.ModelSerializer):
+class RecipeMatchSerializers(FollowRecipeSerializers):
+    """
+    Recipe found by the user's ingredients:
+    coverage - share of the recipe ingredients the user has
+    missing - ingredients the user still needs.
+    """
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.SerializerMethodField()
+
+    def get_missing(self, obj):
+        return IngredientRecipeSerializers(obj.missing, many=True).data
+
+    class Meta(FollowRecipeSerializers.Meta):
+        fields = FollowRecipeSerializers.Meta.fields + ('coverage', 'missing')
+
+
+class FollowUserSerializers(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Subscriber serializer, with additional fields:
     is_subscribed - subscription to the author (True)
@@ -37,28 +65,24 @@ class FollowUserSerializers(serializers.ModelSerializer):
     recipes_count = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=user, author=obj.author).exists()
+        return obj.author_id in get_context_relations(self.context).following
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
-        if recipes_limit:
-            queryset = queryset[:int(recipes_limit)]
-        return FollowRecipeSerializers(queryset, many=True).data
+        recipes = getattr(obj.author, 'recipes_preview', None)
+        if recipes is None:
+            recipes = obj.author.recipes.all()[
+                :self.context.get('recipes_limit')]
+        return FollowRecipeSerializers(recipes, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        return obj.author.recipes_count
 
     class Meta:
         model = Follow
         fields = '__all__'
 
 
-class TagSerializers(serializers.ModelSerializer):
+class TagSerializers(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Tag serializer for recipes.
     """
@@ -67,7 +91,7 @@ class TagSerializers(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class IngredientSerializers(serializers.ModelSerializer):
+class IngredientSerializers(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Ingredients Serializer.
     """
@@ -76,7 +100,8 @@ class IngredientSerializers(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class IngredientRecipeSerializers(serializers.ModelSerializer):
+class IngredientRecipeSerializers(TimedSerializerMixin,
+                                  serializers.ModelSerializer):
     """
     Serializer of ingredients for recipes
     """
@@ -92,7 +117,7 @@ class IngredientRecipeSerializers(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class RecipeSerializers(serializers.ModelSerializer):
+class RecipeSerializers(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Recipe serializer with additional fields:
     1. Favorites field False/True
@@ -105,32 +130,61 @@ class RecipeSerializers(serializers.ModelSerializer):
     """
     tags = TagSerializers(read_only=True, many=True)
     author = CustomUserSerializers(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
+    image_thumbnail = RenditionImageField('thumbnail', source='image')
+    image_medium = RenditionImageField('medium', source='image')
+    image_webp = RenditionImageField('medium_webp', source='image')
+    image_thumbnail_webp = RenditionImageField('thumbnail_webp',
+                                               source='image')
     ingredients = IngredientRecipeSerializers(read_only=True, many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Favorite.objects.filter(user=user, recipe=obj.id).exists()
+        return obj.id in get_context_relations(self.context).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(user=user, recipe=obj.id).exists()
+        return obj.id in get_context_relations(self.context).shopping_cart
+
+    def get_initial_list(self, name):
+        """
+        tags and ingredients: lists in JSON requests,
+        in multipart forms a JSON list or repeated fields,
+        each with a JSON value (an object, an id) or a plain id.
+        """
+        if not hasattr(self.initial_data, 'getlist'):
+            return self.initial_data.get(name)
+        items = []
+        for value in self.initial_data.getlist(name):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                items.append(value)
+                continue
+            items.extend(value if isinstance(value, list) else [value])
+        return items
 
     def validate(self, data):
-        ingredients = self.initial_data.get('ingredients')
+        ingredients = self.get_initial_list('ingredients')
         ingredients_list = {}
+        if ingredients and (
+                not isinstance(ingredients, list)
+                or not all(isinstance(ingredient, dict)
+                           for ingredient in ingredients)):
+            raise serializers.ValidationError({'ingredients': _(
+                'Передайте список объектов с полями id и amount')})
         if ingredients:
             for ingredient in ingredients:
                 if ingredient.get('id') in ingredients_list:
                     raise ValidationError(
                         _('Ингредиент может быть добавлен только один раз'))
-                if int(ingredient.get('amount')) <= 0:
+                try:
+                    amount = int(ingredient.get('amount'))
+                    int(ingredient.get('id'))
+                except (TypeError, ValueError):
+                    raise serializers.ValidationError({'ingredients': _(
+                        'id и amount ингредиента должны быть целыми числами')})
+                if amount <= 0:
                     raise ValidationError(
                         _('Добавьте количество для ингредиента больше 0')
                     )
@@ -141,52 +195,112 @@ class RecipeSerializers(serializers.ModelSerializer):
         else:
             raise ValidationError(_('Добавьте ингредиент в рецепт'))
 
+    def get_ingredients(self, ids):
+        ingredients = Ingredient.objects.in_bulk(ids)
+        missing = set(ids) - set(ingredients)
+        if missing:
+            raise serializers.ValidationError(
+                {'ingredients': _(f'Ингредиенты {sorted(missing)} не найдены')}
+            )
+        return ingredients
+
     def ingredient_recipe_create(self, ingredients_set, recipe):
-        for ingredient_get in ingredients_set:
-            ingredient = Ingredient.objects.get(id=ingredient_get.get('id'))
-            IngredientRecipe.objects.create(ingredient=ingredient,
-                                            recipe=recipe,
-                                            amount=ingredient_get.get('amount')
-                                            )
+        amounts = {int(ingredient_get.get('id')): ingredient_get.get('amount')
+                   for ingredient_get in ingredients_set}
+        ingredients = self.get_ingredients(list(amounts))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(ingredient=ingredients[ingredient_id],
+                             recipe=recipe,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+        )
+
+    def ingredient_recipe_update(self, ingredients_set, recipe):
+        """
+        Writes only the ingredient rows that have changed,
+        returns True if any row was written.
+        """
+        amounts = {int(ingredient_get.get('id')): int(ingredient_get.get(
+            'amount')) for ingredient_get in ingredients_set}
+        current = {ingredient_recipe.ingredient_id: ingredient_recipe
+                   for ingredient_recipe in recipe.ingredients.all()}
+        removed = [ingredient_recipe.id for ingredient_id, ingredient_recipe
+                   in current.items() if ingredient_id not in amounts]
+        if removed:
+            IngredientRecipe.objects.filter(id__in=removed).delete()
+        changed = []
+        for ingredient_id, ingredient_recipe in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != ingredient_recipe.amount:
+                ingredient_recipe.amount = amount
+                changed.append(ingredient_recipe)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        added = [{'id': ingredient_id, 'amount': amount}
+                 for ingredient_id, amount in amounts.items()
+                 if ingredient_id not in current]
+        if added:
+            self.ingredient_recipe_create(added, recipe)
+        return bool(removed or changed or added)
 
+    def recipe_ingredients_changed(self):
+        """Bulk writes send no signals, the matcher index is told here."""
+        transaction.on_commit(lambda: bump_version('recipe-ingredients'))
+
+    def schedule_renditions(self, recipe):
+        """Resized copies are made in the worker pool after the commit."""
+        recipe_id, name = recipe.pk, recipe.image.name
+        transaction.on_commit(lambda: submit(
+            make_recipe_renditions, recipe_id, name))
+
+    @transaction.atomic
     def create(self, validated_data):
         image = validated_data.pop('image')
         recipe = Recipe.objects.create(image=image,
                                        author=self.context['request'].user,
                                        **validated_data)
-        tags = self.initial_data.get('tags')
+        tags = self.get_initial_list('tags')
         recipe.tags.set(tags)
-        ingredients_set = self.initial_data.get('ingredients')
+        ingredients_set = self.get_initial_list('ingredients')
         self.ingredient_recipe_create(ingredients_set, recipe)
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
+        self.recipe_ingredients_changed()
+        self.schedule_renditions(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.image = validated_data.get('image', instance.image)
+        if 'image' in validated_data:
+            instance.image = validated_data['image']
+            instance.renditions_ready = False
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get('cooking_time',
                                                    instance.cooking_time)
-        instance.tags.clear()
-        tags = self.initial_data.get('tags')
+        tags = self.get_initial_list('tags')
         instance.tags.set(tags)
         instance.save()
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        ingredients_set = self.initial_data.get('ingredients')
-        self.ingredient_recipe_create(ingredients_set, instance)
+        ingredients_set = self.get_initial_list('ingredients')
+        if self.ingredient_recipe_update(ingredients_set, instance):
+            self.recipe_ingredients_changed()
+        Recipe.objects.filter(pk=instance.pk).update_search_vector()
+        if 'image' in validated_data:
+            self.schedule_renditions(instance)
         return instance
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = ('search_vector', 'favorites_count', 'shopping_cart_count',
+                   'popularity_score', 'trending_score', 'renditions_ready')
 
 
-class FavoriteSerializers(serializers.ModelSerializer):
+class FavoriteSerializers(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer of selected recipes.
     """
     id = serializers.ReadOnlyField(source='recipe.id')
     name = serializers.ReadOnlyField(source='recipe.name')
-    image = serializers.ImageField(source='recipe.image')
+    image = RenditionImageField('thumbnail', source='recipe.image')
     cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
 
     class Meta:
@@ -194,13 +308,14 @@ class FavoriteSerializers(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ShoppingCardSerializers(serializers.ModelSerializer):
+class ShoppingCardSerializers(TimedSerializerMixin,
+                              serializers.ModelSerializer):
     """
     Shopping list serializer.
     """
     id = serializers.ReadOnlyField(source='recipe.id')
     name = serializers.ReadOnlyField(source='recipe.name')
-    image = serializers.ImageField(source='recipe.image')
+    image = RenditionImageField('thumbnail', source='recipe.image')
     cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
 
     class Meta:
@@ -0,0 +1,180 @@
+import csv
+import hashlib
+import io
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils.translation import gettext as _
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+from recipes.models import IngredientRecipe
+
+FONT_NAME = 'Country'
+CACHE_PREFIX = 'shopping-list-pdf'
+CACHE_TIMEOUT = 60 * 60
+CHUNK_SIZE = 8192
+ROW_HEIGHT = 25
+TOP = 800
+BOTTOM = 50
+
+# unit: (base unit, how many base units are in it)
+UNITS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+}
+# base unit: (larger unit, how many base units are in it)
+LARGER_UNITS = {
+    'г': ('кг', 1000),
+    'мл': ('л', 1000),
+}
+
+pdfmetrics.registerFont(
+    TTFont(FONT_NAME, os.path.join(settings.BASE_DIR, 'Country.ttf'),
+           'UTF-8'))
+
+
+def format_amount(amount, unit):
+    """1500 г -> 1.5 кг, 200 г stays as it is."""
+    if unit in LARGER_UNITS:
+        larger_unit, factor = LARGER_UNITS[unit]
+        if amount >= factor:
+            amount, unit = amount / factor, larger_unit
+            if amount == int(amount):
+                amount = int(amount)
+    return amount, unit
+
+
+def aggregate(user):
+    """Amounts of the ingredients of the user's shopping list by name."""
+    return IngredientRecipe.objects.filter(
+        recipe__shopping_carts__user=user).values(
+            'ingredient__name',
+            'ingredient__measurement_unit').order_by(
+                'ingredient__name').annotate(amount=Sum('amount'))
+
+
+def normalize(rows):
+    """
+    Merges lines of one ingredient with compatible units (г/кг, мл/л).
+    rows - aggregated ingredient__name, ingredient__measurement_unit,
+    amount ordered by name, the result is read in a single pass.
+    """
+    name, amounts = None, {}
+    for row in rows:
+        if row['ingredient__name'] != name:
+            yield from merged_lines(name, amounts)
+            name, amounts = row['ingredient__name'], {}
+        base_unit, factor = UNITS.get(row['ingredient__measurement_unit'],
+                                      (row['ingredient__measurement_unit'],
+                                       1))
+        amounts[base_unit] = amounts.get(base_unit, 0) + row['amount'] * factor
+    yield from merged_lines(name, amounts)
+
+
+def merged_lines(name, amounts):
+    for unit, amount in amounts.items():
+        amount, unit = format_amount(amount, unit)
+        yield {'name': name, 'measurement_unit': unit, 'amount': amount}
+
+
+def iter_text(ingredients):
+    for ingredient in ingredients:
+        yield (f"{ingredient['name']} - {ingredient['amount']} "
+               f"{ingredient['measurement_unit']}\n")
+
+
+class Echo:
+    """File-like object for csv.writer, returns the written line."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['name', 'amount', 'measurement_unit'])
+    for ingredient in ingredients:
+        yield writer.writerow([ingredient['name'], ingredient['amount'],
+                               ingredient['measurement_unit']])
+
+
+def iter_json(ingredients):
+    yield '['
+    separator = ''
+    for ingredient in ingredients:
+        yield separator + json.dumps(ingredient, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+# format: (content type, generator, attachment file name)
+FORMATS = {
+    'txt': ('text/plain; charset=utf-8', iter_text, 'Shoppinglist.txt'),
+    'csv': ('text/csv; charset=utf-8', iter_csv, 'Shoppinglist.csv'),
+    'json': ('application/json', iter_json, None),
+}
+
+
+def content_hash(ingredients):
+    content = json.dumps(ingredients, ensure_ascii=False, sort_keys=True,
+                         default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def cache_key(ingredients):
+    """The key depends only on the aggregated ingredient list."""
+    return f'{CACHE_PREFIX}:{content_hash(ingredients)}'
+
+
+def draw_columns(canvas, height):
+    canvas.setFont(FONT_NAME, size=16)
+    canvas.drawString(70, height, _('Название:'))
+    canvas.drawString(220, height, _('Количество:'))
+    canvas.drawString(350, height, _('Единица измерения:'))
+    return height - 40
+
+
+def render_pdf(ingredients):
+    """
+    Draws the shopping list,
+    a new page is started when the rows reach the bottom margin.
+    """
+    buffer = io.BytesIO()
+    canvas = Canvas(buffer)
+    canvas.setFont(FONT_NAME, size=36)
+    canvas.drawString(70, TOP, _('Продуктовый помощник'))
+    canvas.drawString(70, TOP - 40, _('список покупок:'))
+    canvas.setFont(FONT_NAME, size=18)
+    canvas.drawString(70, TOP - 100, _('Ингредиенты:'))
+    height = draw_columns(canvas, TOP - 130)
+    for ingredient in ingredients:
+        if height < BOTTOM:
+            canvas.showPage()
+            height = draw_columns(canvas, TOP)
+        canvas.drawString(70, height, f"{ingredient['name']}")
+        canvas.drawString(250, height, f"{ingredient['amount']}")
+        canvas.drawString(380, height, f"{ingredient['measurement_unit']}")
+        height -= ROW_HEIGHT
+    canvas.save()
+    return buffer.getvalue()
+
+
+def get_pdf(ingredients):
+    """Rendered PDF from the cache, ReportLab runs only on a miss."""
+    key = cache_key(ingredients)
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = render_pdf(ingredients)
+        cache.set(key, pdf, CACHE_TIMEOUT)
+    return pdf
+
+
+def iter_chunks(content, chunk_size=CHUNK_SIZE):
+    for start in range(0, len(content), chunk_size):
+        yield content[start:start + chunk_size]
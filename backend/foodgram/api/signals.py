@@ -0,0 +1,70 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+from .cache import bump_version
+from .facets import invalidate_facets
+from .fragments import invalidate_author, invalidate_recipe, invalidate_recipes
+from .relations import invalidate_relations
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredients_changed(**kwargs):
+    bump_version('ingredients')
+    invalidate_recipes()
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tags_changed(**kwargs):
+    bump_version('tags')
+    invalidate_recipes()
+    invalidate_facets()
+
+
+@receiver([post_save, post_delete], sender=IngredientRecipe)
+def recipe_ingredients_changed(instance, **kwargs):
+    bump_version('recipe-ingredients')
+    invalidate_recipe(instance.recipe_id)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(instance, **kwargs):
+    invalidate_recipe(instance.pk)
+    invalidate_facets()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    invalidate_facets()
+    if not reverse:
+        invalidate_recipe(instance.pk)
+    elif pk_set is None:
+        invalidate_recipes()
+    else:
+        for recipe_id in pk_set:
+            invalidate_recipe(recipe_id)
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, created, update_fields=None, **kwargs):
+    """
+    Authors are a part of the payloads of their recipes,
+    new users and logins are not.
+    Recipes of a deleted user are deleted with their own signals.
+    """
+    if created or (update_fields is not None
+                   and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_author(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+@receiver([post_save, post_delete], sender=Follow)
+def user_relations_changed(instance, **kwargs):
+    invalidate_relations(instance.user_id)
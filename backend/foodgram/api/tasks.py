@@ -0,0 +1,33 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS,
+                              thread_name_prefix='foodgram-task')
+
+
+def run(task, *args):
+    """
+    Worker threads keep their database connections between tasks:
+    broken or expired ones are closed before and after every task,
+    as Django does around requests. Nobody reads the futures,
+    so failures are logged here.
+    """
+    close_old_connections()
+    try:
+        return task(*args)
+    except Exception:
+        logger.exception('Background task %s failed', task.__qualname__)
+        return None
+    finally:
+        close_old_connections()
+
+
+def submit(task, *args):
+    return executor.submit(run, task, *args)
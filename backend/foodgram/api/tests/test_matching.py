@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import defaultdict
+from unittest import mock
+
+from api.cache import bump_version
+from api.matching import IngredientMatcher
+from recipes.models import IngredientRecipe
+
+
+def recipe_ingredients():
+    ingredients = defaultdict(set)
+    for recipe_id, ingredient_id in IngredientRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id'):
+        ingredients[recipe_id].add(ingredient_id)
+    return ingredients
+
+
+def test_match_coverage(user_ids):
+    ingredients = recipe_ingredients()
+    recipe_id, ingredient_ids = next(iter(ingredients.items()))
+    matches = IngredientMatcher().match(list(ingredient_ids)[:1], 100)
+    assert matches
+    assert [coverage for _, coverage in matches] == sorted(
+        (coverage for _, coverage in matches), reverse=True)
+    for match_id, coverage in matches:
+        assert coverage == 1 / len(ingredients[match_id])
+    full = IngredientMatcher().match(list(ingredient_ids), 100)
+    assert full[0][1] == 1
+    assert (recipe_id, 1) in full
+
+
+def test_match_unknown_ingredients(user_ids):
+    assert IngredientMatcher().match([0], 10) == []
+
+
+def test_rebuild_in_background(user_ids):
+    matcher = IngredientMatcher()
+    matcher.match([], 10)
+    index = matcher.index
+    version = bump_version('recipe-ingredients')
+    with mock.patch('api.matching.submit') as submit:
+        matcher.match([], 10)
+    assert matcher.index is index
+    submit.assert_called_once_with(matcher.build_in_background, version)
+    matcher.build_in_background(version)
+    assert matcher.index is not index
+    assert matcher.version == version
+    assert not matcher.building
+
+
+def test_match_does_not_wait_for_rebuild(user_ids):
+    matcher = IngredientMatcher()
+    matcher.match([], 10)
+    index = matcher.index
+    started, release = threading.Event(), threading.Event()
+
+    def slow_build(version):
+        started.set()
+        release.wait(5)
+        matcher.index, matcher.version = (index[0], index[1], {}), version
+
+    matcher.build = slow_build
+    version = bump_version('recipe-ingredients')
+    with mock.patch('api.matching.submit'):
+        matcher.match([], 10)
+        builder = threading.Thread(target=matcher.build_in_background,
+                                   args=(version,))
+        builder.start()
+        assert started.wait(5)
+        start = time.monotonic()
+        matcher.match([], 10)
+        elapsed = time.monotonic() - start
+        assert matcher.index is index
+        release.set()
+        builder.join(5)
+    assert elapsed < 1
+    assert matcher.version == version
+    assert not matcher.building
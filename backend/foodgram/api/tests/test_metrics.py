@@ -0,0 +1,37 @@
+import itertools
+import re
+from unittest import mock
+
+from api.middleware import QueryMetrics, current_metrics
+from api.serializers import RecipeSerializers
+from recipes.models import Recipe
+
+
+def server_timing(response):
+    return dict(re.findall(r'(\w+);(?:dur=([\d.]+)|desc="[^"]*")',
+                           response['Server-Timing']))
+
+
+def test_server_timing(user_ids, user_client):
+    response = user_client.get('/api/recipes/')
+    timings = server_timing(response)
+    assert set(timings) == {'db', 'serialize', 'render', 'app', 'total',
+                            'size'}
+    assert float(timings['serialize']) > 0
+    assert f'size;desc="{len(response.content)} bytes"' in response[
+        'Server-Timing']
+
+
+def test_outermost_serializer_is_timed(user_ids):
+    metrics = QueryMetrics()
+    token = current_metrics.set(metrics)
+    try:
+        with mock.patch('api.mixins.time.perf_counter',
+                        side_effect=itertools.count()):
+            RecipeSerializers(Recipe.objects.with_relations().first(),
+                              context={'request': None}).data
+    finally:
+        current_metrics.reset(token)
+    # one start and one end reading: nested serializers are not timed
+    assert metrics.serialize == 1
+    assert not metrics.serializing
@@ -0,0 +1,21 @@
+import pytest
+
+from api.management.commands.check_query_budget import BUDGETS
+from recipes.models import Recipe
+
+
+@pytest.mark.parametrize('name, url, authenticated, budget', BUDGETS,
+                         ids=[budget[0] for budget in BUDGETS])
+def test_query_budget(name, url, authenticated, budget, user_ids,
+                      anonymous_client, user_client,
+                      django_assert_max_num_queries):
+    recipe = Recipe.objects.filter(author__in=user_ids).first()
+    ingredient = recipe.ingredients.select_related(
+        'ingredient').first().ingredient
+    url = url.format(recipe=recipe.id, ingredient=ingredient.name[:12])
+    client = user_client if authenticated else anonymous_client
+    with django_assert_max_num_queries(budget):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    assert response.status_code == 200
@@ -0,0 +1,78 @@
+import pytest
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from api import shopping_list
+from api.filters import RecipeFilter
+from api.management.commands.check_query_budget import PAGE_SIZE
+from recipes.models import Recipe, Tag
+from users.models import Follow
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='Query plans are checked on PostgreSQL only')
+
+SEQ_SCAN = 'Seq Scan'
+
+
+def recipe_filter(user, query):
+    request = RequestFactory().get(f'/api/recipes/?{query}')
+    request.user = user
+    return RecipeFilter(QueryDict(query), request=request,
+                        queryset=Recipe.objects.only('id')).qs[:PAGE_SIZE]
+
+
+# name, queryset of (user, author, tag slugs), indexes the plan must use
+QUERIES = (
+    ('recipes by author',
+     lambda user, author, tags: recipe_filter(user, f'author={author.id}'),
+     ('recipe_author_id_idx',)),
+    ('favorite recipes',
+     lambda user, author, tags: recipe_filter(user, 'is_favorited=1'),
+     ('unique_favorite',)),
+    ('recipes in the shopping list',
+     lambda user, author, tags: recipe_filter(user, 'is_in_shopping_cart=1'),
+     ('unique_shopping_cart',)),
+    ('recipes by a tag',
+     lambda user, author, tags: recipe_filter(user, f'tags={tags[0]}'),
+     ('recipes_recipe_tags_',)),
+    ('recipes with all tags',
+     lambda user, author, tags: recipe_filter(
+         user, f'tags={tags[0]}&tags={tags[1]}&tags_mode=all'),
+     ('recipes_recipe_tags_',)),
+    ('follow lookup',
+     lambda user, author, tags: Follow.objects.filter(user=user,
+                                                      author=author),
+     ('unique_follow',)),
+    ('subscriptions',
+     lambda user, author, tags: Follow.objects.filter(
+         user=user).order_by('-id')[:PAGE_SIZE],
+     ('follow_user_id_idx',)),
+    ('shopping list aggregate',
+     lambda user, author, tags: shopping_list.aggregate(user),
+     ('unique_shopping_cart', 'ingredient_recipe_cover_idx')),
+)
+
+
+@pytest.fixture
+def planner(user):
+    """
+    Fresh statistics and no sequential scans: the planner picks
+    the cheapest index, the test checks it is the intended one.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+        cursor.execute('SET LOCAL enable_seqscan = off')
+
+
+@pytest.mark.parametrize('name, build, indexes', QUERIES,
+                         ids=[query[0] for query in QUERIES])
+def test_query_plan(name, build, indexes, user, user_ids, planner):
+    author = Recipe.objects.filter(author__in=user_ids).first().author
+    tags = list(Tag.objects.order_by('-id').values_list(
+        'slug', flat=True)[:2])
+    plan = build(user, author, tags).explain()
+    assert SEQ_SCAN not in plan, plan
+    for index in indexes:
+        assert index in plan, plan
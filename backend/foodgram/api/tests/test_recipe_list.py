@@ -0,0 +1,51 @@
+from recipes.models import Recipe, Tag
+
+
+def test_cursor_pages(user_ids, anonymous_client):
+    response = anonymous_client.get(
+        '/api/recipes/', {'pagination': 'cursor', 'limit': 25})
+    first = [recipe['id'] for recipe in response.data['results']]
+    assert 'count' not in response.data
+    assert first == list(Recipe.objects.order_by('-id').values_list(
+        'id', flat=True)[:25])
+    response = anonymous_client.get(response.data['next'])
+    second = [recipe['id'] for recipe in response.data['results']]
+    assert second == list(Recipe.objects.filter(id__lt=first[-1]).order_by(
+        '-id').values_list('id', flat=True)[:25])
+
+
+def test_cursor_pages_by_score(user_ids, anonymous_client):
+    for position, recipe in enumerate(Recipe.objects.order_by('id')):
+        Recipe.objects.filter(pk=recipe.pk).update(
+            popularity_score=position % 7)
+    expected = list(Recipe.objects.order_by(
+        '-popularity_score', '-id').values_list('id', flat=True))
+    url, ids = '/api/recipes/?ordering=popular&pagination=cursor&limit=7', []
+    while url:
+        response = anonymous_client.get(url)
+        ids += [recipe['id'] for recipe in response.data['results']]
+        url = response.data['next']
+    assert ids == expected
+
+
+def test_facets(user_ids, anonymous_client):
+    response = anonymous_client.get('/api/recipes/', {'facets': 1})
+    facets = response.data['facets']
+    for tag in Tag.objects.all():
+        assert facets['tags'][tag.slug] == Recipe.objects.filter(
+            tags=tag).count()
+    assert sum(facets['cooking_time'].values()) == Recipe.objects.count()
+
+
+def test_facets_under_tags(user_ids, anonymous_client):
+    tag = Tag.objects.first()
+    response = anonymous_client.get('/api/recipes/',
+                                    {'facets': 1, 'tags': tag.slug})
+    facets = response.data['facets']
+    tagged = Recipe.objects.filter(tags=tag)
+    assert response.data['count'] == tagged.count()
+    assert sum(facets['cooking_time'].values()) == tagged.count()
+    assert facets['tags'][tag.slug] == tagged.count()
+    for other in Tag.objects.exclude(pk=tag.pk):
+        assert facets['tags'][other.slug] == Recipe.objects.filter(
+            tags=other).count()
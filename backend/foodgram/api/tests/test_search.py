@@ -0,0 +1,24 @@
+import pytest
+
+from api.search import IngredientIndex
+from recipes.models import Ingredient
+
+
+@pytest.fixture
+def ingredients(db):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit='г')
+        for name in ('Milk', 'dry milk', 'milk chocolate', 'sugar'))
+
+
+@pytest.mark.parametrize('query', ['mil', 'MIL', 'Mil'])
+def test_search_db_ignores_case(ingredients, query):
+    result = [ingredient.name for ingredient in
+              IngredientIndex().search_db(query, 10)]
+    assert result == ['Milk', 'milk chocolate', 'dry milk']
+
+
+def test_search_db_matches_index(ingredients):
+    index = IngredientIndex()
+    assert ([ingredient.name for ingredient in index.search_db('milk', 10)]
+            == [ingredient.name for ingredient in index.search('milk', 10)])
@@ -0,0 +1,34 @@
+from api.shopping_list import normalize
+
+
+def row(name, unit, amount):
+    return {'ingredient__name': name, 'ingredient__measurement_unit': unit,
+            'amount': amount}
+
+
+def test_normalize_merges_compatible_units():
+    rows = [row('мука', 'г', 500), row('мука', 'кг', 1),
+            row('молоко', 'л', 1), row('молоко', 'мл', 250)]
+    assert list(normalize(rows)) == [
+        {'name': 'мука', 'measurement_unit': 'кг', 'amount': 1.5},
+        {'name': 'молоко', 'measurement_unit': 'л', 'amount': 1.25},
+    ]
+
+
+def test_normalize_keeps_other_units_apart():
+    rows = [row('соль', 'г', 200), row('соль', 'по вкусу', 1),
+            row('яйца', 'шт.', 3)]
+    assert list(normalize(rows)) == [
+        {'name': 'соль', 'measurement_unit': 'г', 'amount': 200},
+        {'name': 'соль', 'measurement_unit': 'по вкусу', 'amount': 1},
+        {'name': 'яйца', 'measurement_unit': 'шт.', 'amount': 3},
+    ]
+
+
+def test_normalize_whole_larger_units():
+    assert list(normalize([row('сахар', 'г', 2000)])) == [
+        {'name': 'сахар', 'measurement_unit': 'кг', 'amount': 2}]
+
+
+def test_normalize_empty():
+    assert list(normalize([])) == []
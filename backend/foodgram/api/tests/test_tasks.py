@@ -0,0 +1,18 @@
+from unittest import mock
+
+from api import tasks
+
+
+def failing_task():
+    raise RuntimeError('database is gone')
+
+
+def test_run_closes_connections_and_logs_errors(caplog):
+    with mock.patch('api.tasks.close_old_connections') as close:
+        assert tasks.run(failing_task) is None
+    assert close.call_count == 2
+    assert 'failing_task failed' in caplog.text
+
+
+def test_submit_returns_the_result():
+    assert tasks.submit(sum, (1, 2)).result(5) == 3
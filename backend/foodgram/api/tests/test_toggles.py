@@ -0,0 +1,43 @@
+from unittest import mock
+
+import pytest
+from django.db.models import QuerySet
+
+from api.mixins import delete_once
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+
+@pytest.mark.parametrize('model, name, counter', [
+    (Favorite, 'favorite', 'favorites_count'),
+    (ShoppingCart, 'shopping_cart', 'shopping_cart_count'),
+])
+def test_repeated_delete_decrements_once(model, name, counter, user,
+                                         user_client):
+    recipe_id = model.objects.filter(user=user).values_list(
+        'recipe_id', flat=True).first()
+    Recipe.objects.filter(pk=recipe_id).update(**{counter: 5})
+    url = f'/api/recipes/{recipe_id}/{name}/'
+    assert user_client.delete(url).status_code == 204
+    assert user_client.delete(url).status_code == 400
+    assert getattr(Recipe.objects.get(pk=recipe_id), counter) == 4
+
+
+def test_delete_after_concurrent_delete(user):
+    favorite = Favorite.objects.filter(user=user).first()
+    Recipe.objects.filter(pk=favorite.recipe_id).update(favorites_count=5)
+    assert delete_once(Favorite, pk=favorite.pk)
+    # the second request read the row before the first deleted it
+    with mock.patch.object(QuerySet, 'first', return_value=favorite):
+        assert not delete_once(Favorite, pk=favorite.pk)
+    assert Recipe.objects.get(pk=favorite.recipe_id).favorites_count == 4
+
+
+def test_repeated_unsubscribe_decrements_once(user, user_client):
+    author_id = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True).first()
+    User.objects.filter(pk=author_id).update(followers_count=5)
+    url = f'/api/users/{author_id}/subscribe/'
+    assert user_client.delete(url).status_code == 204
+    assert user_client.delete(url).status_code == 400
+    assert User.objects.get(pk=author_id).followers_count == 4
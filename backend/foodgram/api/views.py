@@ -1,29 +1,53 @@
-import io
-
-from django.db.models import Sum
-from django.http import FileResponse
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.utils.translation import gettext as _
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen.canvas import Canvas
 from rest_framework import permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
 
+from recipes.feed import feed_recipe_ids
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
                             ShoppingCart, Tag)
 from users.models import Follow, User
 
+from . import exports, fragments, shopping_list
+from .facets import recipe_facets
 from .filters import IngredientSearchFilter, RecipeFilter
-from .mixins import CustomRecipeModelViewSet, ListRetrieveCustomViewSet
-from .pagination import LimitPagePagination
+from .matching import ingredient_matcher
+from .mixins import (CustomRecipeModelViewSet, ListRetrieveCustomViewSet,
+                     delete_once)
+from .pagination import MAX_PAGE_SIZE, KeysetIdPagination, LimitPagePagination
 from .permissions import AuthorOrReadOnly
+from .relations import UserRelations, get_request_relations
+from .renderers import (CSVRenderer, PDFRenderer, PlainTextRenderer,
+                        TimedJSONRenderer)
 from .serializers import (FavoriteSerializers, FollowUserSerializers,
-                          IngredientSerializers, RecipeSerializers,
-                          ShoppingCardSerializers, TagSerializers)
+                          IngredientSerializers, RecipeMatchSerializers,
+                          RecipeSerializers, ShoppingCardSerializers,
+                          TagSerializers)
+
+
+def get_recipe_payloads(request, recipe_ids):
+    """
+    Shared recipe payloads from the fragment cache,
+    the flags of the user are put on top of them.
+    """
+    def build(missing):
+        recipes = Recipe.objects.filter(id__in=missing).with_relations()
+        return RecipeSerializers(
+            recipes, many=True,
+            context={'request': request, 'relations': UserRelations()}).data
+
+    payloads = fragments.get_payloads(recipe_ids, request.get_host(), build)
+    relations = get_request_relations(request)
+    return [relations.apply(payload) for payload in payloads]
 
 
 class CustomUserViewSet(UserViewSet):
@@ -32,49 +56,85 @@ class CustomUserViewSet(UserViewSet):
     1. Subscribe
     2. Delete the subscription
     3. List of subscriptions
+    4. Feed of recipes of the subscriptions (cursor pagination)
     Pagination:
     Page - page (by default 6 objects per page)
     Limit - limit on the output of objects per page
     Recipes_limit - the number of recipes the author has
+    (no more than recipes_limit_max).
     """
     pagination_class = LimitPagePagination
+    recipes_limit_max = 10
+
+    def get_recipes_limit(self, request):
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return self.recipes_limit_max
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            raise ValidationError(
+                {'recipes_limit': _('Введите целое число.')})
+        if recipes_limit < 0:
+            raise ValidationError(
+                {'recipes_limit': _('Введите число не меньше нуля.')})
+        return min(recipes_limit, self.recipes_limit_max)
 
     @action(detail=False, permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request):
-        queryset = Follow.objects.filter(user=request.user)
+        recipes_limit = self.get_recipes_limit(request)
+        queryset = Follow.objects.filter(
+            user=request.user
+        ).select_related('author').prefetch_related(
+            Prefetch('author__recipes',
+                     queryset=Recipe.objects.latest_per_author(recipes_limit),
+                     to_attr='recipes_preview')
+        )
         page = self.paginate_queryset(queryset)
-        serializer = FollowUserSerializers(page, many=True,
-                                           context={'request': request})
+        serializer = FollowUserSerializers(
+            page, many=True,
+            context={'request': request, 'recipes_limit': recipes_limit})
         return self.get_paginated_response(serializer.data)
 
+    @action(detail=False, permission_classes=[permissions.IsAuthenticated])
+    def feed(self, request):
+        paginator = KeysetIdPagination()
+        recipe_ids = paginator.paginate_ids(
+            lambda limit, before: feed_recipe_ids(request.user, limit,
+                                                  before),
+            request)
+        return paginator.get_paginated_response(
+            get_recipe_payloads(request, recipe_ids))
+
     @action(detail=True,
             methods=['post'],
             permission_classes=[permissions.IsAuthenticated])
     def subscribe(self, request, id=None):
+        recipes_limit = self.get_recipes_limit(request)
         user = request.user
         author = get_object_or_404(User, id=id)
         if user == author:
             return Response({'errors':
                             _('Вы не можете подписаться на себя.')},
                             status=status.HTTP_400_BAD_REQUEST)
-        if Follow.objects.filter(user=user, author=author).exists():
+        try:
+            with transaction.atomic():
+                follow = Follow.objects.create(user=user, author=author)
+        except IntegrityError:
             return Response({'errors':
                             _('Вы уже подписались на автора.')},
                             status=status.HTTP_400_BAD_REQUEST)
-        Follow.objects.create(user=user, author=author)
-        queryset = Follow.objects.get(user=request.user, author=author)
-        serializer = FollowUserSerializers(queryset,
-                                           context={'request': request})
+        serializer = FollowUserSerializers(
+            follow,
+            context={'request': request, 'recipes_limit': recipes_limit})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def subscribe_del(self, request, id=None):
-        user = request.user
-        author = get_object_or_404(User, id=id)
-        if not Follow.objects.filter(user=user, author=author).exists():
+        if not delete_once(Follow, user=request.user, author_id=id):
+            get_object_or_404(User, id=id)
             return Response({'errors': 'Подписки не существует.'},
                             status=status.HTTP_400_BAD_REQUEST)
-        Follow.objects.get(user=user, author=author).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -85,6 +145,7 @@ class TagViewSet(ListRetrieveCustomViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializers
     permission_classes = (permissions.AllowAny,)
+    cache_name = 'tags'
 
 
 class IngredientViewSet(ListRetrieveCustomViewSet):
@@ -96,7 +157,8 @@ class IngredientViewSet(ListRetrieveCustomViewSet):
     serializer_class = IngredientSerializers
     permission_classes = (permissions.AllowAny,)
     filter_backends = (IngredientSearchFilter,)
-    search_fields = ('name',)
+    cache_name = 'ingredients'
+    cache_params = (IngredientSearchFilter.search_param,)
 
 
 class RecipeViewSet(CustomRecipeModelViewSet):
@@ -104,7 +166,14 @@ class RecipeViewSet(CustomRecipeModelViewSet):
     Receptviews with additional methods:
     1. Add/Remove from favorites
     2. Add/remove from the shopping list
-    3. Get a shopping list in PDF format
+    3. Get a shopping list in PDF, TXT, CSV or JSON format
+    (PDF also in the background)
+    4. Find recipes by the ingredients the user has
+    5. facets=1 adds recipe counts per tag and cooking time to the list
+    Recipes are read from the shared fragment cache,
+    favorites, shopping list and subscription flags are added per request.
+    Recipes are sent as JSON with a Base64 image or as multipart/form-data
+    with the image file and tags/ingredients as JSON strings.
     """
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializers
@@ -112,6 +181,35 @@ class RecipeViewSet(CustomRecipeModelViewSet):
     filter_backends = (DjangoFilterBackend, )
     filter_class = RecipeFilter
     permission_classes = (AuthorOrReadOnly,)
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+
+    def get_queryset(self):
+        return Recipe.objects.with_relations()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(Recipe.objects.only('id'))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            page = queryset
+        response = self.get_paginated_response(
+            get_recipe_payloads(request, [recipe.id for recipe in page]))
+        if request.query_params.get('facets') in ('1', 'true'):
+            response.data['facets'] = recipe_facets(request)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = get_object_or_404(Recipe.objects.only('id'),
+                                   pk=kwargs['pk'])
+        self.check_object_permissions(request, recipe)
+        return Response(get_recipe_payloads(request, [recipe.id])[0])
+
+    def perform_create(self, serializer):
+        recipe = serializer.save()
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
+
+    def perform_update(self, serializer):
+        recipe = serializer.save()
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[permissions.IsAuthenticated])
@@ -138,36 +236,98 @@ class RecipeViewSet(CustomRecipeModelViewSet):
         return Response(_('Разрешены только POST и DELETE запросы'),
                         status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    @action(detail=False, permission_classes=[permissions.IsAuthenticated])
+    @action(detail=False, permission_classes=[permissions.AllowAny])
+    def match(self, request):
+        """
+        ingredients - ids of the ingredients the user has (1,2,3)
+        limit - the number of recipes (no more than MAX_PAGE_SIZE).
+        """
+        try:
+            ingredient_ids = [
+                int(ingredient_id)
+                for value in request.query_params.getlist('ingredients')
+                for ingredient_id in value.split(',') if ingredient_id
+            ]
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            raise ValidationError(_('Введите целые числа.'))
+        if not ingredient_ids:
+            raise ValidationError({'ingredients': _('Добавьте ингредиенты')})
+        matches = ingredient_matcher.match(
+            ingredient_ids, max(1, min(limit, MAX_PAGE_SIZE)))
+        coverage = dict(matches)
+        order = {recipe_id: position
+                 for position, (recipe_id, _coverage) in enumerate(matches)}
+        recipes = Recipe.objects.filter(id__in=order).prefetch_related(
+            Prefetch('ingredients',
+                     queryset=IngredientRecipe.objects.select_related(
+                         'ingredient').exclude(
+                             ingredient_id__in=ingredient_ids),
+                     to_attr='missing'))
+        recipes = sorted(recipes, key=lambda recipe: order[recipe.id])
+        for recipe in recipes:
+            recipe.coverage = round(coverage[recipe.id], 4)
+        return Response(RecipeMatchSerializers(
+            recipes, many=True, context={'request': request}).data)
+
+    def get_shopping_list(self, user):
+        return shopping_list.normalize(
+            shopping_list.aggregate(user).iterator())
+
+    def get_export_format(self, request):
+        """
+        ?format= or a type named in the Accept header,
+        PDF when the client accepts anything.
+        """
+        if request.query_params.get('format'):
+            return request.accepted_renderer.format
+        if request.accepted_media_type in request.headers.get('Accept', ''):
+            return request.accepted_renderer.format
+        return PDFRenderer.format
+
+    @action(detail=False, permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=[TimedJSONRenderer, PDFRenderer,
+                              CSVRenderer, PlainTextRenderer])
     def download_shopping_cart(self, request):
-        user = request.user
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__shopping_carts__user=user).values(
-                'ingredient__name',
-                'ingredient__measurement_unit').order_by(
-                    'ingredient__name').annotate(amount=Sum('amount'))
-        buffer = io.BytesIO()
-        canvas = Canvas(buffer)
-        pdfmetrics.registerFont(
-            TTFont('Country', 'Country.ttf', 'UTF-8'))
-        canvas.setFont('Country', size=36)
-        canvas.drawString(70, 800, _('Продуктовый помощник'))
-        canvas.drawString(70, 760, _('список покупок:'))
-        canvas.setFont('Country', size=18)
-        canvas.drawString(70, 700, _('Ингредиенты:'))
-        canvas.setFont('Country', size=16)
-        canvas.drawString(70, 670, _('Название:'))
-        canvas.drawString(220, 670, _('Количество:'))
-        canvas.drawString(350, 670, _('Единица измерения:'))
-        height = 630
-        for ingredient in ingredients:
-            canvas.drawString(70, height, f"{ingredient['ingredient__name']}")
-            canvas.drawString(250, height,
-                              f"{ingredient['amount']}")
-            canvas.drawString(380, height,
-                              f"{ingredient['ingredient__measurement_unit']}")
-            height -= 25
-        canvas.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True,
-                            filename='Shoppinglist.pdf')
+        ingredients = self.get_shopping_list(request.user)
+        export_format = self.get_export_format(request)
+        if export_format in shopping_list.FORMATS:
+            content_type, generator, filename = (
+                shopping_list.FORMATS[export_format])
+            response = StreamingHttpResponse(generator(ingredients),
+                                             content_type=content_type)
+            if filename:
+                response['Content-Disposition'] = (
+                    f'attachment; filename="{filename}"')
+            return response
+        pdf = shopping_list.get_pdf(list(ingredients))
+        response = StreamingHttpResponse(shopping_list.iter_chunks(pdf),
+                                         content_type='application/pdf')
+        response['Content-Disposition'] = (
+            'attachment; filename="Shoppinglist.pdf"')
+        response['Content-Length'] = len(pdf)
+        return response
+
+    def export_status(self, request, job_id):
+        export_status = exports.get_status(job_id)
+        if export_status is None:
+            raise NotFound()
+        data = {'id': job_id, 'status': export_status}
+        if export_status == exports.DONE:
+            data['url'] = request.build_absolute_uri(
+                default_storage.url(exports.export_name(job_id)))
+        return data
+
+    @action(detail=False, methods=['post'],
+            permission_classes=[permissions.IsAuthenticated])
+    def export_shopping_cart(self, request):
+        job_id = exports.start_export(
+            list(self.get_shopping_list(request.user)))
+        return Response(self.export_status(request, job_id),
+                        status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False,
+            url_path=r'export_shopping_cart/(?P<job_id>[0-9a-f]{64})',
+            permission_classes=[permissions.IsAuthenticated])
+    def export_shopping_cart_status(self, request, job_id=None):
+        return Response(self.export_status(request, job_id))
@@ -0,0 +1,35 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from api.management.commands.check_query_budget import PAGE_SIZE
+from recipes.dataset import populate
+from users.models import User
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def user_ids(db):
+    return populate(users=12, recipes=60, follows=PAGE_SIZE,
+                    favorites=PAGE_SIZE, shopping_cart=PAGE_SIZE, seed=1)
+
+
+@pytest.fixture
+def user(user_ids):
+    return User.objects.get(id=user_ids[0])
+
+
+@pytest.fixture
+def anonymous_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
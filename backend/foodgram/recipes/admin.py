@@ -28,9 +28,10 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('author', 'name', 'tags')
     inlines = [IngredientInLine]
 
+    @admin.display(ordering='favorites_count')
     def favorites(self, obj):
-        """Counts how many times a recipe has been added to favorites"""
-        return obj.favorites.count()
+        """How many times a recipe has been added to favorites"""
+        return obj.favorites_count
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
@@ -0,0 +1,102 @@
+import random
+import secrets
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from users.models import Follow, User
+
+from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                     ShoppingCart, Tag)
+
+IMAGE_NAME = 'recipe/dataset.jpg'
+HISTORY_DAYS = 60
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'по вкусу')
+
+
+def ids(model, **lookup):
+    return list(model.objects.filter(**lookup).order_by('id').values_list(
+        'id', flat=True))
+
+
+def populate(users=10, recipes=50, ingredients=100, tags=3, per_recipe=8,
+             follows=5, favorites=5, shopping_cart=5, batch_size=1000,
+             seed=None):
+    """
+    Fills the database with generated data using bulk inserts:
+    users, tags, ingredients, recipes with per_recipe ingredients,
+    and per user `follows` subscriptions, `favorites` favorite
+    and `shopping_cart` shopping list recipes added during
+    the last HISTORY_DAYS days.
+    The same seed gives the same data. Names carry a prefix
+    (random without a seed), so the data can be added to a
+    database that already has rows. Signals are not sent,
+    counters and search vectors are rebuilt by the caller.
+    Returns the ids of the created users.
+    """
+    generator = random.Random(seed)
+    prefix = (secrets.token_hex(4) if seed is None
+              else f'{generator.getrandbits(32):08x}')
+    password = make_password(None)
+    User.objects.bulk_create(
+        (User(username=f'{prefix}-user{number}',
+              email=f'{prefix}-user{number}@example.com',
+              first_name=f'Имя {number}', last_name=f'Фамилия {number}',
+              password=password)
+         for number in range(users)),
+        batch_size=batch_size)
+    user_ids = ids(User, username__startswith=f'{prefix}-')
+    Tag.objects.bulk_create(
+        Tag(name=f'{prefix} тег {number}', slug=f'{prefix}-{number}',
+            color=f'#{generator.getrandbits(24):06x}')
+        for number in range(tags))
+    tag_ids = ids(Tag, slug__startswith=f'{prefix}-')
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=f'{prefix} ингредиент {number}',
+                    measurement_unit=generator.choice(UNITS))
+         for number in range(ingredients)),
+        batch_size=batch_size)
+    ingredient_ids = ids(Ingredient, name__startswith=f'{prefix} ')
+    Recipe.objects.bulk_create(
+        (Recipe(author_id=generator.choice(user_ids),
+                name=f'{prefix} рецепт {number}',
+                image=IMAGE_NAME,
+                text=f'Описание рецепта {number}',
+                cooking_time=generator.randint(1, 120))
+         for number in range(recipes)),
+        batch_size=batch_size)
+    recipe_ids = ids(Recipe, name__startswith=f'{prefix} ')
+    IngredientRecipe.objects.bulk_create(
+        (IngredientRecipe(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                          amount=generator.randint(1, 1000))
+         for recipe_id in recipe_ids
+         for ingredient_id in generator.sample(
+             ingredient_ids, min(per_recipe, len(ingredient_ids)))),
+        batch_size=batch_size)
+    Recipe.tags.through.objects.bulk_create(
+        (Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+         for recipe_id in recipe_ids
+         for tag_id in generator.sample(
+             tag_ids, generator.randint(1, len(tag_ids)))),
+        batch_size=batch_size)
+    now = timezone.now()
+    for model, per_user in ((Favorite, favorites),
+                            (ShoppingCart, shopping_cart)):
+        model.objects.bulk_create(
+            (model(user_id=user_id, recipe_id=recipe_id,
+                   created=now - timedelta(
+                       seconds=generator.randint(0, HISTORY_DAYS * 86400)))
+             for user_id in user_ids
+             for recipe_id in generator.sample(
+                 recipe_ids, min(per_user, len(recipe_ids)))),
+            batch_size=batch_size)
+    Follow.objects.bulk_create(
+        (Follow(user_id=user_id, author_id=author_id)
+         for user_id in user_ids
+         for author_id in [
+             author_id for author_id in generator.sample(
+                 user_ids, min(follows + 1, len(user_ids)))
+             if author_id != user_id][:follows]),
+        batch_size=batch_size)
+    return user_ids
@@ -0,0 +1,137 @@
+import heapq
+
+from django.db import connection
+from django.db.models import Count
+
+from users.models import Follow
+
+from .models import FeedItem, Recipe
+
+# authors with more followers are not written to the feeds,
+# their recipes are read at request time
+FANOUT_LIMIT = 1000
+FEED_SIZE = 500
+BACKFILL_SIZE = 50
+BATCH_SIZE = 1000
+
+
+def add_items(items):
+    FeedItem.objects.bulk_create(items, batch_size=BATCH_SIZE,
+                                 ignore_conflicts=True)
+
+
+def fan_out(recipe):
+    """A new recipe goes to the feeds of every follower of the author."""
+    if recipe.author.followers_count > FANOUT_LIMIT:
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=recipe.author_id).values_list('user_id', flat=True)
+    add_items(FeedItem(user_id=user_id, recipe_id=recipe.id,
+                       author_id=recipe.author_id)
+              for user_id in follower_ids.iterator())
+
+
+def trim(user_id):
+    """Only the newest FEED_SIZE recipes are kept."""
+    boundary = FeedItem.objects.filter(user_id=user_id).order_by(
+        '-recipe_id').values_list('recipe_id', flat=True)[FEED_SIZE:]
+    FeedItem.objects.filter(user_id=user_id,
+                            recipe_id__lte=boundary[:1]).delete()
+
+
+def latest_items(follow):
+    recipe_ids = Recipe.objects.filter(author_id=follow.author_id).order_by(
+        '-id').values_list('id', flat=True)[:BACKFILL_SIZE]
+    return (FeedItem(user_id=follow.user_id, recipe_id=recipe_id,
+                     author_id=follow.author_id)
+            for recipe_id in recipe_ids)
+
+
+def backfill(follow):
+    """The latest recipes of a new subscription are added to the feed."""
+    if follow.author.followers_count > FANOUT_LIMIT:
+        return
+    add_items(latest_items(follow))
+    trim(follow.user_id)
+
+
+def remove(follow):
+    FeedItem.objects.filter(user_id=follow.user_id,
+                            author_id=follow.author_id).delete()
+
+
+def rebuild():
+    """Feeds of every user from the subscriptions, after bulk inserts."""
+    FeedItem.objects.all().delete()
+    follows = Follow.objects.select_related('author').order_by('user_id')
+    user_id = None
+    for follow in follows.iterator():
+        if user_id is not None and follow.user_id != user_id:
+            trim(user_id)
+        user_id = follow.user_id
+        if follow.author.followers_count <= FANOUT_LIMIT:
+            add_items(latest_items(follow))
+    if user_id is not None:
+        trim(user_id)
+
+
+def author_no_longer_popular(author_id):
+    """
+    Recipes of a popular author were read at request time,
+    when the author falls to FANOUT_LIMIT followers
+    they are written to the feeds of the followers:
+    one INSERT ... SELECT for all of them, then the feeds
+    over FEED_SIZE are trimmed. Runs in the worker pool.
+    """
+    operations = connection.ops
+    columns = ', '.join(FeedItem._meta.get_field(name).column
+                        for name in ('user', 'recipe', 'author'))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{operations.insert_statement(ignore_conflicts=True)} '
+            f'{FeedItem._meta.db_table} ({columns}) '
+            f'SELECT follow.user_id, recipe.id, %s '
+            f'FROM {Follow._meta.db_table} follow, '
+            f'(SELECT id FROM {Recipe._meta.db_table} WHERE author_id = %s '
+            f'ORDER BY id DESC LIMIT %s) recipe '
+            f'WHERE follow.author_id = %s '
+            f'{operations.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [author_id, author_id, BACKFILL_SIZE, author_id])
+    crowded = FeedItem.objects.filter(
+        user_id__in=Follow.objects.filter(author_id=author_id).values(
+            'user_id')).order_by().values('user_id').annotate(
+                items=Count('id')).filter(items__gt=FEED_SIZE)
+    for user_id in crowded.values_list('user_id', flat=True):
+        trim(user_id)
+
+
+def feed_recipe_ids(user, limit, before=None):
+    """
+    Ids of the newest `limit` recipes of the feed below `before`:
+    a keyset page of the user's feed items (user, -recipe index)
+    merged with the newest recipes of every popular author
+    the user follows (author, -id index).
+    """
+    items = FeedItem.objects.filter(user=user)
+    if before is not None:
+        items = items.filter(recipe_id__lt=before)
+    sources = [items.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True)[:limit]]
+    popular_authors = Follow.objects.filter(
+        user=user,
+        author__followers_count__gt=FANOUT_LIMIT).values_list(
+            'author_id', flat=True)
+    for author_id in popular_authors:
+        recipes = Recipe.objects.filter(author_id=author_id)
+        if before is not None:
+            recipes = recipes.filter(id__lt=before)
+        sources.append(recipes.order_by('-id').values_list(
+            'id', flat=True)[:limit])
+    recipe_ids = []
+    for recipe_id in heapq.merge(*sources, reverse=True):
+        if recipe_ids and recipe_ids[-1] == recipe_id:
+            continue
+        recipe_ids.append(recipe_id)
+        if len(recipe_ids) == limit:
+            break
+    return recipe_ids
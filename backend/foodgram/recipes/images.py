@@ -0,0 +1,75 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, JpegImagePlugin
+
+RENDITIONS_DIR = 'recipe/renditions'
+# name: (maximum size, format)
+RENDITIONS = {
+    'thumbnail': ((320, 320), 'JPEG'),
+    'medium': ((960, 960), 'JPEG'),
+    'thumbnail_webp': ((320, 320), 'WEBP'),
+    'medium_webp': ((960, 960), 'WEBP'),
+}
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+
+def rendition_name(name, rendition):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    extension = EXTENSIONS[RENDITIONS[rendition][1]]
+    return f'{RENDITIONS_DIR}/{stem}_{rendition}.{extension}'
+
+
+def strip_metadata(file):
+    """
+    Re-encodes the image without EXIF and other metadata,
+    the orientation from EXIF is applied to the pixels.
+    The colour profile is kept, JPEG keeps its quantization tables
+    and subsampling (as quality='keep', which needs the original
+    image object and fails after the rotation).
+    Animated GIFs are returned unchanged.
+    """
+    file.seek(0)
+    original = Image.open(file)
+    if original.format not in ('JPEG', 'PNG', 'WEBP'):
+        file.seek(0)
+        return file
+    options = {'icc_profile': original.info.get('icc_profile')}
+    if original.format == 'JPEG':
+        options.update(qtables=original.quantization,
+                       subsampling=JpegImagePlugin.get_sampling(original))
+    image = ImageOps.exif_transpose(original)
+    buffer = io.BytesIO()
+    image.save(buffer, format=original.format, **options)
+    return ContentFile(buffer.getvalue(), name=file.name)
+
+
+def make_renditions(name):
+    """Saves resized copies of a recipe image next to the original."""
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    for rendition, (size, image_format) in RENDITIONS.items():
+        copy = image.copy()
+        copy.thumbnail(size)
+        if copy.mode not in ('RGB', 'L'):
+            copy = copy.convert('RGB')
+        buffer = io.BytesIO()
+        copy.save(buffer, format=image_format, quality=85,
+                  icc_profile=image.info.get('icc_profile'))
+        path = rendition_name(name, rendition)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def rendition_url(image, rendition):
+    """
+    URL of a rendition or None while it has not been created,
+    readiness is stored on the recipe, the storage is not asked.
+    """
+    if not image or not getattr(image.instance, 'renditions_ready', False):
+        return None
+    return default_storage.url(rendition_name(image.name, rendition))
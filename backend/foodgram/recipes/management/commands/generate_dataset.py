@@ -0,0 +1,53 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.translation import gettext as _
+
+from api.cache import bump_version
+from api.fragments import invalidate_recipes
+from recipes import feed
+from recipes.dataset import populate
+from recipes.models import Recipe
+
+SCALE_OPTIONS = {
+    'users': 100,
+    'recipes': 1000,
+    'ingredients': 500,
+    'tags': 6,
+    'per_recipe': 8,
+    'follows': 10,
+    'favorites': 20,
+    'shopping_cart': 5,
+}
+
+
+class Command(BaseCommand):
+    help = ('Generates a synthetic dataset with bulk inserts: users, '
+            'recipes, ingredients, subscriptions, favorites and carts')
+
+    def add_arguments(self, parser):
+        for name, default in SCALE_OPTIONS.items():
+            parser.add_argument(f'--{name.replace("_", "-")}',
+                                default=default, type=int)
+        parser.add_argument('--seed', type=int,
+                            help='The same seed gives the same dataset')
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        scale = {name: options[name] for name in SCALE_OPTIONS}
+        if min(scale.values()) < 0 or not scale['users'] or not scale['tags']:
+            raise CommandError(_('Users and tags must be positive numbers'))
+        user_ids = populate(seed=options['seed'],
+                            batch_size=options['batch_size'], **scale)
+        Recipe.objects.filter(author__in=user_ids).update_search_vector()
+        call_command('rebuild_counters', stdout=self.stdout)
+        feed.rebuild()
+        call_command('update_popularity', stdout=self.stdout)
+        for name in ('ingredients', 'tags', 'recipe-ingredients',
+                     'recipe-facets'):
+            transaction.on_commit(lambda name=name: bump_version(name))
+        invalidate_recipes()
+        self.stdout.write(self.style.SUCCESS(
+            'Dataset generated: ' + ', '.join(
+                f'{name}={value}' for name, value in scale.items())))
@@ -1,36 +1,127 @@
+import csv
 import json
 import os
+from itertools import islice
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db.utils import IntegrityError
+from django.db import transaction
 from django.utils.translation import gettext as _
 
+from api.cache import bump_version
 from recipes.models import Ingredient
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+READ_SIZE = 64 * 1024
+
+
+def read_json(file):
+    """
+    Reads a JSON array of ingredients object by object,
+    the whole file is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    for chunk in iter(lambda: file.read(READ_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError(_('Expected a JSON array'))
+                started = True
+                position += 1
+                continue
+            if position >= len(buffer) or buffer[position] == ']':
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item['measurement_unit']
+        buffer = buffer[position:]
+    if buffer.strip() not in ('', ']'):
+        raise CommandError(_('Invalid JSON file'))
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
+READERS = {'json': read_json, 'csv': read_csv}
 
 
 class Command(BaseCommand):
+    help = 'Loads ingredients from a JSON or CSV file in the data folder'
 
     def add_arguments(self, parser):
         parser.add_argument('filename', default='ingredients.json', nargs='?',
                             type=str)
+        parser.add_argument('--format', choices=READERS,
+                            help='File format, by default from the extension')
+        parser.add_argument('--batch-size', default=1000, type=int)
+        parser.add_argument('--update', action='store_true',
+                            help='Update the unit of existing ingredients')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count changes without writing them')
 
     def handle(self, *args, **options):
+        path = os.path.join(DATA_ROOT, options['filename'])
+        file_format = (options['format']
+                       or os.path.splitext(path)[1].lstrip('.').lower())
+        if file_format not in READERS:
+            raise CommandError(_('Unsupported file format'))
+        self.stats = {'inserted': 0, 'updated': 0, 'skipped': 0}
         try:
-            with open(os.path.join(DATA_ROOT, options['filename']), 'r',
-                      encoding='utf-8') as f:
-                data = json.load(f)
-                for ingredient in data:
-                    try:
-                        Ingredient.objects.create(name=ingredient["name"],
-                                                  measurement_unit=ingredient[
-                                                      "measurement_unit"])
-                    except IntegrityError:
-                        print(f'Ingredient {ingredient["name"]} '
-                              f'{ingredient["measurement_unit"]} '
-                              f'already added to the database')
-
+            with open(path, 'r', encoding='utf-8') as f:
+                rows = READERS[file_format](f)
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    self.load_batch(batch, options['update'],
+                                    options['dry_run'])
         except FileNotFoundError:
             raise CommandError(_('The file is missing in the data folder'))
+        if not options['dry_run'] and (self.stats['inserted']
+                                       or self.stats['updated']):
+            bump_version('ingredients')
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}inserted {self.stats['inserted']}, "
+            f"updated {self.stats['updated']}, "
+            f"skipped {self.stats['skipped']}"))
+
+    def load_batch(self, batch, update, dry_run):
+        units = dict(batch)
+        self.stats['skipped'] += len(batch) - len(units)
+        existing = {
+            name: (ingredient_id, measurement_unit)
+            for ingredient_id, name, measurement_unit in
+            Ingredient.objects.filter(name__in=units).values_list(
+                'id', 'name', 'measurement_unit')
+        }
+        new = [Ingredient(name=name, measurement_unit=measurement_unit)
+               for name, measurement_unit in units.items()
+               if name not in existing]
+        changed = []
+        if update:
+            changed = [
+                Ingredient(id=existing[name][0], name=name,
+                           measurement_unit=measurement_unit)
+                for name, measurement_unit in units.items()
+                if name in existing and existing[name][1] != measurement_unit
+            ]
+        self.stats['inserted'] += len(new)
+        self.stats['updated'] += len(changed)
+        self.stats['skipped'] += len(existing) - len(changed)
+        if dry_run:
+            return
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+            Ingredient.objects.bulk_update(changed, ['measurement_unit'])
@@ -0,0 +1,64 @@
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+DAY = 24 * 60 * 60
+# model: weight of one row in the score
+WEIGHTS = {Favorite: 1.0, ShoppingCart: 0.5}
+
+
+class Command(BaseCommand):
+    help = ('Recalculates popular and trending scores of recipes '
+            'from favorites and shopping lists with exponential decay')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--popular-half-life', default=30, type=float,
+                            help='Days after which a row counts half')
+        parser.add_argument('--trending-half-life', default=2, type=float)
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def decayed_scores(self, now, half_lives):
+        """
+        recipe id -> [score for every half-life],
+        sum of weight * 2 ** (-age / half_life) over the rows,
+        read as a stream of (recipe_id, created).
+        """
+        decay = [math.log(2) / (half_life * DAY) for half_life in half_lives]
+        scores = {}
+        for model, weight in WEIGHTS.items():
+            rows = model.objects.order_by().values_list('recipe_id',
+                                                        'created')
+            for recipe_id, created in rows.iterator():
+                age = max((now - created).total_seconds(), 0)
+                recipe_scores = scores.setdefault(recipe_id,
+                                                  [0.0] * len(decay))
+                for position, rate in enumerate(decay):
+                    recipe_scores[position] += weight * math.exp(-rate * age)
+        return scores
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        half_lives = (options['popular_half_life'],
+                      options['trending_half_life'])
+        if min(half_lives) <= 0:
+            raise CommandError(_('Half-life must be a positive number'))
+        scores = self.decayed_scores(timezone.now(), half_lives)
+        changed = []
+        current = Recipe.objects.order_by().values_list(
+            'id', 'popularity_score', 'trending_score')
+        for recipe_id, popularity, trending in current.iterator():
+            new_popularity, new_trending = scores.get(recipe_id, (0.0, 0.0))
+            if (popularity, trending) != (new_popularity, new_trending):
+                changed.append(Recipe(id=recipe_id,
+                                      popularity_score=new_popularity,
+                                      trending_score=new_trending))
+        Recipe.objects.bulk_update(changed,
+                                   ['popularity_score', 'trending_score'],
+                                   batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Scores updated: {len(changed)} recipes'))
@@ -1,10 +1,20 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connection, models
+from django.db.models import (Case, Exists, F, IntegerField, OuterRef,
+                              Prefetch, Q, Subquery, Value, When)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
 from users.models import User
 
+SEARCH_CONFIG = 'russian'
+
 
 class Tag(models.Model):
     """
@@ -39,6 +49,85 @@ class Ingredient(models.Model):
         verbose_name_plural = _('Ингредиенты')
 
 
+class RecipeQuerySet(models.QuerySet):
+    """
+    Recipe QuerySet with everything the recipe serializer needs:
+    author, tags and ingredients loaded in a fixed number of queries.
+    Favorites, shopping list and subscription flags of the user
+    are answered from the cached relation sets (api.relations).
+    """
+    def with_relations(self):
+        return self.prefetch_related(
+            Prefetch('author', queryset=User.objects.prefetch_related(
+                'groups', 'user_permissions')),
+            'tags',
+            Prefetch('ingredients',
+                     queryset=IngredientRecipe.objects.select_related(
+                         'ingredient')),
+        )
+
+    def latest_per_author(self, limit):
+        """
+        Only the newest `limit` recipes of every author, in one query.
+        Used as a prefetch for author previews.
+        """
+        latest = Recipe.objects.filter(
+            author=OuterRef('author')).order_by('-id').values('id')[:limit]
+        return self.filter(id__in=Subquery(latest))
+
+    def update_search_vector(self):
+        """
+        Recalculates the full-text document:
+        name (A), ingredient names (B), description (C).
+        Only PostgreSQL has tsvector, other databases use search() fallback.
+        """
+        if connection.vendor != 'postgresql':
+            return 0
+        ingredient_names = IngredientRecipe.objects.filter(
+            recipe=OuterRef('pk')).order_by().values('recipe').annotate(
+                names=StringAgg('ingredient__name', ' ')).values('names')
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(Coalesce(Subquery(ingredient_names), Value('')),
+                           weight='B', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+
+    def search(self, query):
+        """Recipes matching the query, the most relevant first."""
+        if connection.vendor == 'postgresql':
+            search_query = SearchQuery(query, config=SEARCH_CONFIG)
+            return self.filter(search_vector=search_query).annotate(
+                rank=SearchRank(F('search_vector'), search_query)
+            ).order_by('-rank', '-id')
+        words = query.split()
+        if not words:
+            return self
+        condition = Q()
+        for word in words:
+            condition &= (Q(name__icontains=word) | Q(text__icontains=word)
+                          | Q(Exists(IngredientRecipe.objects.filter(
+                              recipe=OuterRef('pk'),
+                              ingredient__name__icontains=word))))
+        ingredients = IngredientRecipe.objects.filter(
+            Q(*(Q(ingredient__name__icontains=word) for word in words),
+              _connector=Q.OR),
+            recipe=OuterRef('pk'))
+        rank = sum(
+            Case(When(match, then=Value(weight)), default=Value(0),
+                 output_field=IntegerField())
+            for match, weight in (
+                (Q(*(Q(name__icontains=word) for word in words),
+                   _connector=Q.OR), 3),
+                (Exists(ingredients), 2),
+                (Q(*(Q(text__icontains=word) for word in words),
+                   _connector=Q.OR), 1),
+            )
+        )
+        return self.filter(condition).annotate(rank=rank).order_by(
+            '-rank', '-id')
+
+
 class Recipe(models.Model):
     """Recipe Model"""
     tags = models.ManyToManyField(Tag, verbose_name=_('Тег'))
@@ -48,17 +137,39 @@ class Recipe(models.Model):
                                verbose_name=_('Автор'))
     name = models.CharField(_('Имя'), max_length=200, unique=True)
     image = models.ImageField(_('Изображение'), upload_to='recipe/')
+    renditions_ready = models.BooleanField(_('Копии изображения готовы'),
+                                           default=False, editable=False)
     text = models.TextField(_('Описание'))
     cooking_time = models.PositiveIntegerField(
         _('Время приготовления'),
         validators=[MinValueValidator(limit_value=1,
                     message=_("Введите число больше единицы"))])
+    favorites_count = models.PositiveIntegerField(_('В избранном'),
+                                                  default=0, editable=False)
+    shopping_cart_count = models.PositiveIntegerField(
+        _('В списках покупок'), default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    popularity_score = models.FloatField(_('Популярность'), default=0,
+                                         editable=False)
+    trending_score = models.FloatField(_('Популярность за последние дни'),
+                                       default=0, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
     class Meta():
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['author', '-id'],
+                         name='recipe_author_id_idx'),
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+            models.Index(fields=['-popularity_score', '-id'],
+                         name='recipe_popularity_idx'),
+            models.Index(fields=['-trending_score', '-id'],
+                         name='recipe_trending_idx'),
+        ]
         verbose_name = _('Рецепт')
         verbose_name_plural = _('Рецепты')
 
@@ -82,6 +193,11 @@ class IngredientRecipe(models.Model):
 
     class Meta():
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['recipe', 'ingredient'],
+                         include=['amount'],
+                         name='ingredient_recipe_cover_idx'),
+        ]
         verbose_name = _('Ингредиент для рецепта')
         verbose_name_plural = _('Ингредиенты для рецептов')
 
@@ -98,12 +214,18 @@ class Favorite(models.Model):
                                on_delete=models.CASCADE,
                                related_name="favorites",
                                verbose_name=_('Рецепт'))
+    created = models.DateTimeField(_('Добавлен'), default=timezone.now,
+                                   editable=False)
 
     def __str__(self):
         return f'избранное пользователя {self.user}'
 
     class Meta():
         ordering = ['-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_favorite'),
+        ]
         verbose_name = _('Избранный рецепт')
         verbose_name_plural = _('Избранные рецепты')
 
@@ -120,6 +242,8 @@ class ShoppingCart(models.Model):
                                on_delete=models.CASCADE,
                                related_name='shopping_carts',
                                verbose_name=_('Рецепт'))
+    created = models.DateTimeField(_('Добавлен'), default=timezone.now,
+                                   editable=False)
 
     def __str__(self):
         return f'список покупок пользователя {self.user}'
@@ -128,5 +252,42 @@ class ShoppingCart(models.Model):
         ordering = ['-id']
         verbose_name = _('Список покупок')
         verbose_name_plural = _('Списки покупок')
-        models.UniqueConstraint(
-            fields=['user', 'recipe'], name='unique_recording')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_shopping_cart'),
+        ]
+
+
+class FeedItem(models.Model):
+    """
+    Recipe in the feed of a subscriber,
+    written when the recipe is created (see recipes.feed).
+    """
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='feed_items',
+                             verbose_name=_('Пользователь'))
+    recipe = models.ForeignKey(Recipe,
+                               on_delete=models.CASCADE,
+                               related_name='feed_items',
+                               verbose_name=_('Рецепт'))
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+',
+                               verbose_name=_('Автор'))
+
+    def __str__(self):
+        return f'лента пользователя {self.user}'
+
+    class Meta():
+        ordering = ['-recipe']
+        verbose_name = _('Рецепт в ленте')
+        verbose_name_plural = _('Лента подписок')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_feed_item'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='feed_item_user_author_idx'),
+        ]
@@ -0,0 +1,104 @@
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.tasks import submit
+from users.models import Follow, User
+
+from . import feed
+from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                     ShoppingCart)
+
+# name, model, expression; PostgreSQL only (operator classes)
+POSTGRESQL_INDEXES = (
+    ('ingredient_name_prefix_idx', Ingredient,
+     'lower(name) text_pattern_ops'),
+)
+
+
+def update_counter(model, pk, field, delta):
+    """Atomic change of a denormalized counter, never below zero."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(instance, created, **kwargs):
+    if created:
+        update_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(instance, **kwargs):
+    update_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(instance, created, **kwargs):
+    if created:
+        update_counter(Recipe, instance.recipe_id, 'shopping_cart_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(instance, **kwargs):
+    update_counter(Recipe, instance.recipe_id, 'shopping_cart_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, created, **kwargs):
+    if created:
+        update_counter(User, instance.author_id, 'recipes_count', 1)
+        feed.fan_out(instance)
+    Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    update_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver([post_save, post_delete], sender=IngredientRecipe)
+def recipe_ingredients_changed(instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).update_search_vector()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(
+            ingredients__ingredient=instance).update_search_vector()
+
+
+@receiver(post_save, sender=Follow)
+def follow_added(instance, created, **kwargs):
+    if created:
+        update_counter(User, instance.author_id, 'followers_count', 1)
+        feed.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(instance, **kwargs):
+    update_counter(User, instance.author_id, 'followers_count', -1)
+    feed.remove(instance)
+    followers_count = User.objects.filter(
+        pk=instance.author_id).values_list('followers_count', flat=True)
+    if list(followers_count) == [feed.FANOUT_LIMIT]:
+        author_id = instance.author_id
+        transaction.on_commit(lambda: submit(
+            feed.author_no_longer_popular, author_id))
+
+
+def create_postgresql_indexes(using, **kwargs):
+    """
+    Expression indexes other databases cannot create (SQLite in tests),
+    the prefix search on lower(name) is served by the first one.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for name, model, expression in POSTGRESQL_INDEXES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON '
+                           f'{model._meta.db_table} ({expression})')
@@ -0,0 +1,82 @@
+from unittest import mock
+
+import pytest
+
+from recipes import feed
+from recipes.models import FeedItem, Recipe
+from users.models import Follow, User
+
+
+def expected_ids(user, limit):
+    return list(Recipe.objects.filter(
+        author__following__user=user).order_by('-id').values_list(
+            'id', flat=True)[:limit])
+
+
+@pytest.fixture
+def popular_author(user):
+    author_id = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True).first()
+    User.objects.filter(pk=author_id).update(
+        followers_count=feed.FANOUT_LIMIT + 1)
+    return author_id
+
+
+def test_feed_recipe_ids(user):
+    feed.rebuild()
+    assert feed.feed_recipe_ids(user, 15) == expected_ids(user, 15)
+
+
+def test_popular_authors_are_merged(user, popular_author):
+    feed.rebuild()
+    assert not FeedItem.objects.filter(author_id=popular_author).exists()
+    assert feed.feed_recipe_ids(user, 100) == expected_ids(user, 100)
+
+
+def test_author_no_longer_popular(user, popular_author):
+    feed.rebuild()
+    User.objects.filter(pk=popular_author).update(
+        followers_count=feed.FANOUT_LIMIT)
+    feed.author_no_longer_popular(popular_author)
+    assert FeedItem.objects.filter(user=user,
+                                   author_id=popular_author).exists()
+    assert feed.feed_recipe_ids(user, 100) == expected_ids(user, 100)
+
+
+def test_author_no_longer_popular_is_batched(user, popular_author,
+                                             django_assert_num_queries):
+    feed.rebuild()
+    with django_assert_num_queries(2):
+        feed.author_no_longer_popular(popular_author)
+    followers = Follow.objects.filter(author_id=popular_author)
+    latest = min(Recipe.objects.filter(author_id=popular_author).count(),
+                 feed.BACKFILL_SIZE)
+    items = FeedItem.objects.filter(author_id=popular_author)
+    assert items.count() == followers.count() * latest
+
+
+def test_unfollow_backfills_after_commit(user, popular_author,
+                                         django_capture_on_commit_callbacks):
+    with mock.patch('recipes.signals.submit') as submit:
+        with django_capture_on_commit_callbacks(execute=True):
+            Follow.objects.filter(user=user,
+                                  author_id=popular_author).delete()
+            submit.assert_not_called()
+    submit.assert_called_once_with(feed.author_no_longer_popular,
+                                   popular_author)
+
+
+def test_feed_pages(user, popular_author, user_client):
+    feed.rebuild()
+    url, ids = '/api/users/feed/?limit=4', []
+    while url:
+        response = user_client.get(url)
+        assert response.status_code == 200
+        ids += [recipe['id'] for recipe in response.data['results']]
+        url = response.data['next']
+    assert ids == expected_ids(user, None)
+
+
+def test_invalid_cursor(user, user_client):
+    response = user_client.get('/api/users/feed/', {'cursor': 'junk'})
+    assert response.status_code == 404
@@ -26,6 +26,10 @@ class User(AbstractUser):
                             choices=CHOICES,
                             default=USER,
                             max_length=20)
+    recipes_count = models.PositiveIntegerField(_('Количество рецептов'),
+                                                default=0, editable=False)
+    followers_count = models.PositiveIntegerField(_('Количество подписчиков'),
+                                                  default=0, editable=False)
 
     REQUIRED_FIELDS = ['email', 'first_name', 'last_name']
 
@@ -64,5 +68,13 @@ class Follow(models.Model):
         ordering = ['-id']
         verbose_name = _('Подписка')
         verbose_name_plural = _('Подписки')
-        models.UniqueConstraint(
-            fields=['user', 'author'], name='unique_recording')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='follow_not_self'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-id'], name='follow_user_id_idx'),
+        ]
@@ -2,10 +2,13 @@ from django.contrib.auth.hashers import make_password
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
-from users.models import Follow, User
+from api.mixins import TimedSerializerMixin
+from api.relations import get_context_relations
+from users.models import User
 
 
-class CustomCreateUserSerializers(serializers.ModelSerializer):
+class CustomCreateUserSerializers(TimedSerializerMixin,
+                                  serializers.ModelSerializer):
     """
     User creation serializer, redefinition of the password field,
     for encoding the password when saving.
@@ -18,7 +21,7 @@ class CustomCreateUserSerializers(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = '__all__'
+        exclude = ('recipes_count', 'followers_count')
 
     def create(self, validated_data):
         validated_data['password'] = make_password(
@@ -26,7 +29,7 @@ class CustomCreateUserSerializers(serializers.ModelSerializer):
         return super(CustomCreateUserSerializers, self).create(validated_data)
 
 
-class CustomUserSerializers(serializers.ModelSerializer):
+class CustomUserSerializers(TimedSerializerMixin, serializers.ModelSerializer):
     """
     The user's serializer with an additional is_subscribed field,
     returns False or True depending on the subscription to the author.
@@ -35,11 +38,8 @@ class CustomUserSerializers(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=user, author=obj.id).exists()
+        return obj.id in get_context_relations(self.context).following
 
     class Meta:
         model = User
-        fields = '__all__'
+        exclude = ('recipes_count', 'followers_count')